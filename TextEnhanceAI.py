@@ -1,39 +1,49 @@
-﻿import tkinter as tk
-from tkinter import scrolledtext, messagebox, simpledialog
-import difflib
-import re
+﻿import time
+# Cold-start time is measured from here to the first idle main loop
+_START_TIME = time.perf_counter()
+
+import tkinter as tk
+from tkinter import scrolledtext, messagebox, simpledialog, filedialog, ttk
 from datetime import datetime
+import glob
 import os
+import re
 import threading
-
-try:
-    from ollama import Client
-    try:
-        # Prefer top-level list API when available
-        from ollama import list as ollama_list, ListResponse
-    except Exception:
-        ollama_list = None
-        ListResponse = None
-except ImportError:
-    print("Please install the ollama package (pip install ollama).")
-    Client = None
-    ollama_list = None
-    ListResponse = None
-
-# --------------
-# Configurable prompts for each button
-# --------------
-PROMPTS = {
-    "Grammar": "Fix grammar issues without altering the meaning.",
-    "Proofread": "Proofread the text comprehensively, correcting errors and improving readability.",
-    "Natural": "Refine awkward phrasing to make the text feel natural while preserving the original meaning.",
-    "Streamline": "Remove unnecessary elements, clarify the message, and ensure coherence and ease of understanding.",
-    "Awkward": "Fix only awkward or poorly written sentences without making other changes.",
-    "Rewrite": "Rewrite the text to improve clarity, flow, and overall readability.",
-    "Concise": "Make the text more concise by removing redundancy and unnecessary content.",
-    "Polish": "Refine awkward words or phrases to give the text a polished and professional tone.",
-    "Improve": "Enhance the text by proofreading and improving its clarity, flow, and coherence.",
-}
+from concurrent.futures import ThreadPoolExecutor
+
+import teai_diff
+import teai_llm
+# Configurable prompts for each button (shared with the batch CLI)
+from teai_llm import PROMPTS, Cancelled
+from teai_cache import cache_from_env
+from teai_metrics import RequestMetrics, metrics_from_env
+from teai_incremental import ParagraphTracker
+from teai_history import History
+from teai_archive import SCRATCHPAD_GLOB, archive_from_env
+from teai_pipelines import format_stages, load_pipelines, parse_stages, save_pipeline
+from teai_jobs import JobScheduler
+from teai_scratchpad import writer_for_session
+# The ollama package is imported lazily by teai_models, off the startup path
+import teai_models
+
+# Minimum delay between two progressive renders while streaming (milliseconds)
+STREAM_RENDER_INTERVAL_MS = int(os.getenv("TEAI_STREAM_INTERVAL_MS", "150"))
+# The inline diff is inserted in slices of about this many characters; the
+# event loop gets control back between slices so the window keeps repainting
+RENDER_SLICE_CHARS = int(os.getenv("TEAI_RENDER_SLICE_CHARS", "20000"))
+# Draft dropdown entry that turns two-tier editing off
+DRAFT_OFF = "(off)"
+# Translations into several languages are also saved here when set
+TRANSLATIONS_DIR = os.getenv("TEAI_TRANSLATIONS_DIR", "")
+# Undo/Redo patches the text widget in place up to this many changed regions
+# and reloads the whole text beyond that
+HISTORY_INPLACE_EDITS = int(os.getenv("TEAI_HISTORY_INPLACE_EDITS", "200"))
+# Rows listed by the History window per search, newest first
+ARCHIVE_RESULTS = int(os.getenv("TEAI_ARCHIVE_RESULTS", "200"))
+ANY_ACTION = "(any)"
+# Characters outside the Basic Multilingual Plane (emoji and the like)
+NON_BMP = re.compile("[\U00010000-\U0010ffff]")
+
 
 # --------------
 # Custom prompt helper (avoid private tkinter APIs)
@@ -96,15 +106,168 @@ class ToolTip:
 def create_tooltip(widget, text):
     """Helper to attach a tooltip with given text to a widget."""
     ToolTip(widget, text)
+
+
+# --------------
+# Translation results window
+# --------------
+def save_translations(translations, directory):
+    """Write {language: text} as translation_<language>.txt files; returns the paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for language, text in translations.items():
+        name = re.sub(r"[^\w-]+", "_", language)
+        path = os.path.join(directory, f"translation_{name}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        paths.append(path)
+    return paths
+
+
+class TranslationWindow:
+    """A window with one tab per target language, filled in as translations finish."""
+    def __init__(self, parent, languages):
+        self.top = tk.Toplevel(parent)
+        self.top.title("TextEnhanceAI - Translations")
+        self.notebook = ttk.Notebook(self.top)
+        self.notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tabs = {}
+        self.finished = set()
+        for language in languages:
+            frame = tk.Frame(self.notebook)
+            area = scrolledtext.ScrolledText(frame, wrap=tk.WORD, width=80, height=25)
+            area.pack(fill=tk.BOTH, expand=True)
+            area.insert("1.0", "Translating...")
+            self.notebook.add(frame, text=f"{language} ...")
+            self.tabs[language] = (frame, area)
+        buttons = tk.Frame(self.top)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        tk.Button(buttons, text="Save All...", command=self.save_all).pack(side=tk.LEFT, padx=2)
+        tk.Button(buttons, text="Close", command=self.top.destroy).pack(side=tk.RIGHT, padx=2)
+
+    def show(self, language, result):
+        """Fill the tab of language with its translation (or the exception that stopped it)."""
+        if not self.top.winfo_exists():
+            return
+        frame, area = self.tabs[language]
+        area.delete("1.0", tk.END)
+        if isinstance(result, Exception):
+            area.insert("1.0", f"Translation failed: {result}")
+            self.notebook.tab(frame, text=f"{language} (failed)")
+        else:
+            area.insert("1.0", result)
+            self.notebook.tab(frame, text=language)
+            self.finished.add(language)
+
+    def translations(self):
+        """The finished translations as currently shown (including any edits)."""
+        return {language: self.tabs[language][1].get("1.0", "end-1c")
+                for language in self.tabs if language in self.finished}
+
+    def save_all(self):
+        directory = filedialog.askdirectory(parent=self.top, title="Save translations to")
+        if not directory:
+            return
+        try:
+            paths = save_translations(self.translations(), directory)
+        except OSError as e:
+            messagebox.showerror("Translations", f"Could not save: {e}", parent=self.top)
+            return
+        messagebox.showinfo("Translations", f"Saved {len(paths)} files to {directory}.", parent=self.top)
 
 
 # --------------
+# Edit archive browser
+# --------------
+class HistoryWindow:
+    """Search the edit archive (teai_archive) and load a past text into the editor."""
+    def __init__(self, parent, archive, on_load):
+        self.archive = archive
+        self.on_load = on_load
+        self.top = tk.Toplevel(parent)
+        self.top.title("TextEnhanceAI - History")
+
+        bar = tk.Frame(self.top)
+        bar.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(bar, text="Search:").pack(side=tk.LEFT)
+        self.query_var = tk.StringVar()
+        entry = tk.Entry(bar, textvariable=self.query_var, width=40)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(2, 6))
+        entry.bind("<Return>", lambda event: self.search())
+        tk.Label(bar, text="Action:").pack(side=tk.LEFT)
+        self.prompt_var = tk.StringVar(value=ANY_ACTION)
+        tk.OptionMenu(bar, self.prompt_var, ANY_ACTION, *PROMPTS, "Translate", "Custom",
+                      command=lambda value: self.search()).pack(side=tk.LEFT, padx=(2, 6))
+        tk.Button(bar, text="Search", command=self.search).pack(side=tk.LEFT)
+
+        columns = ("time", "action", "model", "changes", "outcome", "match")
+        self.tree = ttk.Treeview(self.top, columns=columns, show="headings", height=12)
+        for column, width in zip(columns, (140, 90, 120, 60, 70, 360)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column == "match")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5)
+        self.tree.bind("<<TreeviewSelect>>", lambda event: self.show_selected())
+
+        self.detail = scrolledtext.ScrolledText(self.top, wrap=tk.WORD, width=100, height=14)
+        self.detail.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        buttons = tk.Frame(self.top)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        tk.Button(buttons, text="Load Original", command=lambda: self.load("user_text")).pack(side=tk.LEFT, padx=2)
+        tk.Button(buttons, text="Load Edited", command=lambda: self.load("edited_text")).pack(side=tk.LEFT, padx=2)
+        self.status_var = tk.StringVar()
+        tk.Label(buttons, textvariable=self.status_var, anchor="w").pack(side=tk.LEFT, fill=tk.X, expand=True, padx=6)
+        tk.Button(buttons, text="Close", command=self.top.destroy).pack(side=tk.RIGHT, padx=2)
+        entry.focus_set()
+        self.search()
+
+    def search(self):
+        prompt = self.prompt_var.get()
+        try:
+            rows = self.archive.search(self.query_var.get(), prompt=None if prompt == ANY_ACTION else prompt,
+                                       limit=ARCHIVE_RESULTS)
+        except Exception as e:
+            self.status_var.set(f"Search failed: {e}")
+            return
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            snippet = " ".join((row["snippet"] or "").split())
+            self.tree.insert("", tk.END, iid=str(row["id"]), values=(
+                row["time"].replace("T", " "), row["prompt"] or row["kind"], row["model"] or "",
+                "" if row["hunks"] is None else row["hunks"], row["outcome"] or "", snippet))
+        more = " (newest first; refine the search to see older ones)" if len(rows) == ARCHIVE_RESULTS else ""
+        self.status_var.set(f"{len(rows)} edits{more}.")
+
+    def selected(self):
+        selection = self.tree.selection()
+        return self.archive.get(int(selection[0])) if selection else None
+
+    def show_selected(self):
+        row = self.selected()
+        if row is None:
+            return
+        self.detail.delete("1.0", tk.END)
+        self.detail.insert("1.0", f"Instruction: {row['instruction']}\n\n--- Original ---\n{row['user_text']}"
+                                  f"\n\n--- Edited ---\n{row['edited_text']}")
+
+    def load(self, field):
+        row = self.selected()
+        if row is not None:
+            self.on_load(row[field], f"history #{row['id']}")
+
+
+# --------------
 # Main application class
 # --------------
 class EditorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("TextEnhanceAI Editor with Local LLM - V 0.12")
+        # Tcl 8.6 counts a character outside the BMP as two in text indices
+        try:
+            self._tk_wide_chars = int(root.tk.call("string", "length", "\U0001F600")) > 1
+        except Exception:
+            self._tk_wide_chars = False
 
         # ----------------------
         # 1) Set starting size and use it as the minimum
@@ -114,9 +277,20 @@ class EditorApp:
 
         # 2) Initialize widgets and buttons
 
-        # Ollama client (make sure you've installed and are running your local LLM server)
-        self.ollama_client = Client() if Client else None
+        # Ollama client (make sure you've installed and are running your local LLM server).
+        # Created on first use; a background thread starts the import right away.
+        self._ollama_client = None
         self.model_name = os.getenv("TEAI_MODEL", "llama3.1:8b")
+        # Response cache (memory LRU + on-disk store) in front of the chat call
+        self.response_cache = cache_from_env()
+        # Per-request timings (teai_metrics); the latest summary is shown in the status bar
+        self.metrics_log = metrics_from_env()
+        self.last_metrics = None
+        # Searchable archive of every edit (teai_archive); scratchpads left in
+        # the working directory by earlier sessions are imported once
+        self.archive = archive_from_env()
+        if self.archive is not None:
+            threading.Thread(target=self._import_scratchpads, daemon=True).start()
 
         # Top bar: model selection
         top_bar = tk.Frame(self.root)
@@ -128,13 +302,61 @@ class EditorApp:
         self.model_optionmenu.pack(side=tk.LEFT, padx=(0, 6))
         refresh_btn = tk.Button(top_bar, text="Refresh", command=self.populate_model_menu)
         refresh_btn.pack(side=tk.LEFT, padx=(0, 8))
-        # Load models initially
-        self.populate_model_menu()
+        # Optional small draft model shown first while the selected model refines
+        draft_label = tk.Label(top_bar, text="Draft:")
+        draft_label.pack(side=tk.LEFT, padx=(0, 2))
+        self.draft_var = tk.StringVar(value=os.getenv("TEAI_DRAFT_MODEL", "") or DRAFT_OFF)
+        self.draft_optionmenu = tk.OptionMenu(top_bar, self.draft_var, DRAFT_OFF)
+        self.draft_optionmenu.pack(side=tk.LEFT, padx=(0, 8))
+        create_tooltip(self.draft_optionmenu,
+                       "Show this fast model's edit first, then replace it with the selected model's.")
+        # Stream tokens as they arrive and render the diff progressively
+        self.stream_var = tk.BooleanVar(value=os.getenv("TEAI_STREAM", "1") != "0")
+        stream_chk = tk.Checkbutton(top_bar, text="Stream", variable=self.stream_var)
+        stream_chk.pack(side=tk.LEFT, padx=(0, 8))
+        create_tooltip(stream_chk, "Show the edit while the model is still generating it.")
+        # Cancel aborts the running request and drops queued ones
+        self.cancel_btn = tk.Button(top_bar, text="Cancel", command=self.cancel_jobs, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=(0, 8))
+        create_tooltip(self.cancel_btn, "Stop the running request and any queued actions.")
+        # Show the last known models immediately; refresh them in the background
+        self._models_timer = None
+        cached_models, cache_age = teai_models.load_cached_models()
+        self._set_model_menu(cached_models or [self.model_name])
+        if cache_age is None or cache_age > teai_models.MODELS_TTL:
+            self.populate_model_menu()
+        else:
+            threading.Thread(target=teai_models.get_client, daemon=True).start()
+            self._schedule_model_refresh(teai_models.MODELS_TTL - cache_age)
+        self.startup_seconds = None
+        self.root.after_idle(self._record_startup_time)
 
         # Text area (scrolled)
         self.text_area = scrolledtext.ScrolledText(self.root, wrap=tk.WORD, width=80, height=25)
         self.text_area.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
 
+        # Tag styles for the inline diff
+        self.text_area.tag_config("deletion", foreground="red")
+        self.text_area.tag_config("addition", foreground="green")
+        self.text_area.tag_config("pending", foreground="gray")
+
+        # Paragraphs edited since the last accepted result are the only ones
+        # re-sent when the same action runs again (teai_incremental)
+        self.paragraphs = ParagraphTracker()
+        self._edited_since_accept = False
+        # Bumped whenever the user changes the text; a job whose count moved
+        # while it ran has an outdated result
+        self._typing_count = 0
+        self._last_pass_key = None
+        self.text_area.bind("<<Modified>>", self._on_text_modified)
+
+        # Texts the session settled on (typed, accepted, rejected), stored as
+        # deltas for Undo/Redo (teai_history)
+        self.history = History()
+        self.text_area.bind("<Control-z>", self.undo)
+        self.text_area.bind("<Control-y>", self.redo)
+        self.text_area.bind("<Control-Z>", self.redo)
+
         # Frame for buttons
         btn_frame = tk.Frame(self.root)
         btn_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -162,6 +384,12 @@ class EditorApp:
         custom_btn.pack(side=tk.LEFT, padx=2)
         create_tooltip(custom_btn, "Enter your own custom instruction.")
 
+        # Button for multi-stage pipelines (saved presets of the prompts above)
+        pipeline_btn = tk.Button(btn_frame, text="Pipeline", command=self.show_pipeline_menu)
+        pipeline_btn.pack(side=tk.LEFT, padx=2)
+        self.pipeline_btn = pipeline_btn
+        create_tooltip(pipeline_btn, "Run several prompts in sequence, e.g. Grammar > Concise > Polish.")
+
         # Quit button
         tk.Button(
             btn_frame, text="Quit", command=self.root.quit
@@ -185,21 +413,70 @@ class EditorApp:
             command=self.reject_all_changes,
             fg='red'
         ).pack(side=tk.LEFT, padx=2)
+
+        next_btn = tk.Button(
+            self.accept_reject_frame,
+            text="Next Change",
+            command=self.jump_to_next_change
+        )
+        next_btn.pack(side=tk.LEFT, padx=2)
+        create_tooltip(next_btn, "Move the cursor to the next highlighted change.")
+
+        undo_btn = tk.Button(self.accept_reject_frame, text="Undo", command=self.undo)
+        undo_btn.pack(side=tk.LEFT, padx=(12, 2))
+        create_tooltip(undo_btn, "Go back to the text before the last edit, accept or reject (Ctrl+Z).")
+        redo_btn = tk.Button(self.accept_reject_frame, text="Redo", command=self.redo)
+        redo_btn.pack(side=tk.LEFT, padx=2)
+        create_tooltip(redo_btn, "Restore the text that was undone (Ctrl+Y).")
+
+        history_btn = tk.Button(self.accept_reject_frame, text="History...", command=self.show_history)
+        history_btn.pack(side=tk.RIGHT, padx=2)
+        create_tooltip(history_btn, "Search past edits and load their original or edited text.")
         
         # We store the â€œdiff-annotatedâ€ version of the text in a separate place
         # so we can choose to accept or reject changes piecewise.
         self.diff_text = ""
         self.temp_html = ""  # If you want to store a temporary HTML version
+        # teai_diff.TextDiff currently shown, used by Accept/Reject and navigation
+        self.last_diff = None
+        # Bumped on every render so that slices of an outdated render stop
+        self._render_generation = 0
+        self._render_pending = False
 
         # For scratchpad logging:
         self.scratchpad_filename = None
         self.first_change_time = None
+        # Background writer (teai_scratchpad) created with the first change
+        self.scratchpad = None
+
+        # Streaming state: the worker publishes the latest partial output and
+        # the Tk thread renders it at most once per STREAM_RENDER_INTERVAL_MS.
+        self._stream_lock = threading.Lock()
+        self._stream_latest = None
+        self._stream_scheduled = False
+        self._streaming = False
+
+        # LLM requests run one at a time; actions clicked meanwhile are queued
+        self.jobs = JobScheduler(dispatch=lambda fn: self.root.after(0, fn))
+        # Running job whose draft is shown while its selected model refines
+        self._draft_job = None
 
         # Status label
         self.status_var = tk.StringVar(value="Ready")
         self.status_label = tk.Label(self.root, textvariable=self.status_var, anchor="w")
         self.status_label.pack(fill=tk.X, padx=5, pady=(0,5))
 
+        # Preload the selected model so the first edit does not wait for it
+        self.model_state = {}
+        self.warmer = teai_models.ModelWarmer(
+            lambda: self.ollama_client,
+            on_state=lambda *state: self.root.after(0, lambda: self._on_model_state(*state)),
+        )
+        self.model_var.trace_add("write", lambda *args: self.warmer.warm(self.model_var.get()))
+        self.draft_var.trace_add("write", lambda *args: self.warmer.warm(self.draft_model()))
+        self.warmer.warm(self.model_var.get())
+        self.warmer.warm(self.draft_model())
+
     # --------------
     # Button callbacks
     # --------------
@@ -215,7 +492,7 @@ class EditorApp:
             return
 
         prompt_text = PROMPTS[prompt_label]
-        self.start_llm_task(user_text, prompt_text)
+        self.start_llm_task(user_text, prompt_text, label=prompt_label, draft_model=self.draft_model())
 
     def run_custom_prompt(self):
         """Prompt user for a custom instruction, then run it."""
@@ -231,7 +508,7 @@ class EditorApp:
         # Custom prompt entry (80 chars wide)
         custom_prompt = ask_custom_string("Custom Prompt", "Enter your prompt:", parent=self.root)
         if custom_prompt:
-            self.start_llm_task(user_text, custom_prompt)
+            self.start_llm_task(user_text, custom_prompt, label="Custom")
 
     def run_translate_prompt(self):
         """
@@ -246,13 +523,134 @@ class EditorApp:
             messagebox.showinfo("Info", "Please enter text to translate.")
             return
 
-        # Ask user what language they want
-        language = simpledialog.askstring("Translate", "Enter the target language:", parent=self.root)
-        if language:
+        # Ask user what language(s) they want
+        answer = simpledialog.askstring(
+            "Translate", "Enter the target language (or several, separated by commas):", parent=self.root)
+        languages = [l.strip() for l in re.split(r"[,;]", answer or "") if l.strip()]
+        if len(languages) > 1:
+            self.run_translation_fanout(user_text, list(dict.fromkeys(languages)))
+        elif languages:
             # Construct a translation instruction
-            translate_prompt = f"Translate the text into {language}. Return only the translated text."
-            self.start_llm_task(user_text, translate_prompt)
+            translate_prompt = teai_llm.translate_instruction(languages[0])
+            self.start_llm_task(user_text, translate_prompt, label="Translate")
+
+    def run_translation_fanout(self, user_text, languages):
+        """
+        Translate into several languages concurrently (teai_llm.translate_many).
+        The text area is left alone; results open in a window with one tab per
+        language and are saved to TEAI_TRANSLATIONS_DIR when it is set.
+        """
+        try:
+            selected_model = (self.model_var.get() or "").strip()
+        except Exception:
+            selected_model = ""
+        if not selected_model:
+            selected_model = self.model_name
+        metrics = RequestMetrics(selected_model, "Translate")
+        metrics.extra["languages"] = languages
+        state = {}
+
+        def prepare():
+            state["window"] = TranslationWindow(self.root, languages)
+            self.status_var.set(f"Translating into {len(languages)} languages...")
+            metrics.start()
+            return user_text
+
+        def on_result(language, result):
+            self.root.after(0, lambda: state["window"].show(language, result))
+
+        def run(job, text):
+            results = teai_llm.translate_many(
+                self.ollama_client, selected_model, languages, text, on_result=on_result,
+                cache=self.response_cache, cancel=job.cancel_event, metrics=metrics,
+            )
+            metrics.finish()
+            return results
+
+        def on_done(results):
+            translations = {l: r for l, r in results.items() if not isinstance(r, Exception)}
+            self._ensure_scratchpad()
+            for language, translation in translations.items():
+                self.log_to_scratchpad(
+                    f"#Translation: {language} #\n\n{translation}\n\n",
+                    record={"event": "translate", "prompt": "Translate", "language": language,
+                            "model": selected_model, "user_text": user_text, "edited_text": translation},
+                )
+            message = f"Translated into {len(translations)} of {len(languages)} languages"
+            message += f" in {metrics.generation_seconds:.1f} s."
+            if TRANSLATIONS_DIR and translations:
+                try:
+                    save_translations(translations, TRANSLATIONS_DIR)
+                    message += f" Saved to {TRANSLATIONS_DIR}."
+                except OSError as e:
+                    message += f" Could not save: {e}"
+            self._record_metrics(metrics, None)
+            self._job_finished(message)
+
+        def on_error(e):
+            self._job_finished("Ready")
+            messagebox.showerror("LLM Error", str(e))
+
+        def on_cancel():
+            self._job_finished("Cancelled.")
+
+        job = self.jobs.submit(("translate", tuple(languages), selected_model, hash(user_text)), run,
+                               prepare=prepare, on_done=on_done, on_error=on_error, on_cancel=on_cancel)
+        if job is None:
+            self.status_var.set("This translation is already queued for this text.")
+            return
+        self.set_busy(True)
+        self.status_var.set(self.busy_status())
 
+    def show_pipeline_menu(self):
+        """Pop up the saved pipelines below the Pipeline button."""
+        menu = tk.Menu(self.root, tearoff=0)
+        for name, stages in load_pipelines().items():
+            menu.add_command(label=f"{name}: {format_stages(stages)}",
+                             command=lambda n=name, s=stages: self.run_pipeline(n, s))
+        menu.add_separator()
+        menu.add_command(label="New pipeline...", command=self.new_pipeline)
+        x = self.pipeline_btn.winfo_rootx()
+        y = self.pipeline_btn.winfo_rooty() + self.pipeline_btn.winfo_height()
+        try:
+            menu.tk_popup(x, y)
+        finally:
+            menu.grab_release()
+
+    def new_pipeline(self):
+        """Ask for the stages of a pipeline, optionally save it, then run it."""
+        spec = ask_custom_string("New Pipeline", "Stages (e.g. Grammar > Concise > Polish):", parent=self.root)
+        if not spec:
+            return
+        try:
+            stages = parse_stages(spec)
+        except ValueError as e:
+            messagebox.showerror("Pipeline", str(e))
+            return
+        name = simpledialog.askstring("New Pipeline", "Save as (leave empty to run once):", parent=self.root)
+        if name and name.strip():
+            name = name.strip()
+            try:
+                save_pipeline(name, stages)
+            except OSError as e:
+                messagebox.showerror("Pipeline", f"Could not save the pipeline: {e}")
+        else:
+            name = format_stages(stages)
+        self.run_pipeline(name, stages)
+
+    def run_pipeline(self, name, stages):
+        """Run the PROMPTS named in stages one after another over the text."""
+        if not self.ollama_client:
+            messagebox.showerror("Error", "Ollama client not initialized or not installed.")
+            return
+
+        user_text = self.text_area.get("1.0", tk.END).strip()
+        if not user_text:
+            messagebox.showinfo("Info", "Please enter text to edit.")
+            return
+
+        self.start_llm_task(user_text, f"Pipeline {name}: {format_stages(stages)}", label=name, stages=stages)
+
     # --------------
     # LLM + diff logic
     # --------------
@@ -260,83 +658,370 @@ class EditorApp:
         """Backwards-compatible: start async LLM work and update UI when done."""
         self.start_llm_task(user_text, instruction)
 
-    def start_llm_task(self, user_text, instruction):
-        """Start the LLM call in a background thread and update UI when done."""
+    def draft_model(self):
+        """The draft model to show first, or None when two-tier mode is off."""
+        draft = (self.draft_var.get() or "").strip()
+        if not draft or draft == DRAFT_OFF or draft == (self.model_var.get() or "").strip():
+            return None
+        return draft
+
+    def start_llm_task(self, user_text, instruction, label=None, draft_model=None, stages=None):
+        """
+        Queue an LLM edit on the job scheduler and update the UI when done.
+
+        If other requests are queued or running, the edit is applied to the
+        result of the previous one when its turn comes. Clicking the same
+        action twice in a row on the same text only queues it once. label
+        names the action in the metrics (defaults to "Custom").
+
+        With draft_model, both models start on the same input; the draft's
+        diff is shown as soon as it arrives and is replaced by the selected
+        model's unless the user has accepted, rejected or edited it meanwhile.
+
+        With stages (PROMPTS names), each chunk goes through those prompts in
+        order (teai_llm.edit_pipeline) and instruction only describes the
+        pipeline; the intermediate texts are logged, only the composite diff
+        is shown.
+        """
         if not self.ollama_client:
             messagebox.showerror("Error", "Ollama client not initialized or not installed.")
             return
 
-        def worker():
-            system_prompt = (
-                "You are a helpful, concise assistant that carefully edits text "
-                "based on instructions. Return only the edited text, without extra commentary."
+        try:
+            selected_model = (self.model_var.get() or "").strip()
+        except Exception:
+            selected_model = ""
+        if not selected_model:
+            selected_model = self.model_name
+        follow_up = self.jobs.pending() > 0
+        state = {}
+        metrics = RequestMetrics(selected_model, label or "Custom")
+        draft_metrics = None
+        if draft_model:
+            draft_metrics = RequestMetrics(draft_model, label or "Custom")
+            draft_metrics.extra["tier"] = "draft"
+            metrics.extra.update(tier="final", draft_model=draft_model)
+
+        def prepare():
+            # UI thread, right before the job starts
+            text = user_text
+            if follow_up and self._diff_is_current():
+                text = self.last_diff.new_text
+            stream = bool(self.stream_var.get())
+            clean = None
+            if self._edited_since_accept and not follow_up:
+                clean, dirty, total = self.paragraphs.dirty(text, (instruction, selected_model))
+            state.update(text=text, stream=stream, clean=clean, typing=self._typing_count)
+            if not follow_up:
+                # Keep what was typed so Undo can come back to it
+                self.history.record(text, "Typing")
+            self._streaming = stream
+            # Any typing from now on marks the result as outdated
+            self.text_area.edit_modified(False)
+            if clean is not None:
+                self.status_var.set(f"Re-editing {dirty} of {total} paragraphs...")
+            else:
+                self.status_var.set(self.busy_status())
+            metrics.start()
+            if draft_metrics:
+                draft_metrics.start()
+                self.status_var.set(f"Drafting with {draft_model}, refining with {selected_model}...")
+            return text
+
+        def edit(job, text, model, stream, model_metrics, show_progress=True):
+            # Long documents are split at blank lines and edited by a
+            # bounded pool of concurrent requests, then reassembled in order
+            texts = teai_llm.edit_pipeline(
+                self.ollama_client,
+                model,
+                [PROMPTS[s] for s in stages] if stages else [instruction],
+                text,
+                stream=stream,
+                cache=self.response_cache,
+                cancel=job.cancel_event,
+                on_progress=(lambda snapshot: self._queue_stream_update(text, snapshot))
+                if stream and show_progress else None,
+                metrics=model_metrics,
+                clean=state["clean"],
             )
-            history = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Instruction:\n{instruction}\n\nText:\n{user_text}"}
-            ]
+            model_metrics.finish()
+            if stages:
+                state["intermediates"] = list(zip(stages, texts[:-1]))
+            return texts[-1]
 
-            try:
+        def run(job, text):
+            if not draft_model:
+                return edit(job, text, selected_model, state["stream"], metrics)
+            # The selected model works in the background while the draft is produced
+            # and shown. It streams without rendering so that Cancel closes its stream
+            # instead of waiting for the whole answer.
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                final = pool.submit(edit, job, text, selected_model, True, metrics, show_progress=False)
+                draft_text = None
                 try:
-                    selected_model = (self.model_var.get() or "").strip()
-                except Exception:
-                    selected_model = ""
-                if not selected_model:
-                    selected_model = self.model_name
-                response = self.ollama_client.chat(
-                    model=selected_model,
-                    messages=history,
-                    options={
-                        'num_predict': 2048,
-                        'temperature': 0.7,
-                        'top_p': 0.9,
-                    },
-                )
-                if "message" in response and "content" in response["message"]:
-                    edited_text = response["message"]["content"].strip()
+                    draft_text = edit(job, text, draft_model, state["stream"], draft_metrics)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    metrics.extra["draft_error"] = str(e)
+                    self.root.after(0, lambda e=e: self._on_draft_error(job, state, draft_model, selected_model, e))
                 else:
-                    raise RuntimeError("No content received from LLM.")
-            except Exception as e:
-                self.root.after(0, lambda: (self.set_busy(False), messagebox.showerror("LLM Error", str(e))))
+                    self.root.after(0, lambda: self._on_draft_result(
+                        job, state, instruction, draft_text, draft_model, selected_model, draft_metrics))
+                edited_text = final.result()
+            metrics.extra["draft_seconds"] = draft_metrics.generation_seconds
+            if draft_text is not None:
+                metrics.extra["changes_vs_draft"] = len(teai_diff.TextDiff(draft_text, edited_text).hunks)
+            return edited_text
+
+        def on_done(edited_text):
+            self._draft_job = None
+            if state.get("draft_diff") is not None:
+                if self.last_diff is not state["draft_diff"] or not self._diff_is_current():
+                    # Accepted, rejected or edited while the selected model was working
+                    metrics.extra["discarded"] = True
+                    if self.metrics_log is not None:
+                        self.metrics_log.record(metrics)
+                    self._job_finished(f"Draft reviewed or edited; the {selected_model} result was discarded.")
+                    return
+            elif self._typing_count != state["typing"]:
+                # The user edited the text while the model was working
+                self._job_finished("Text changed during processing; result discarded.")
                 return
+            self._on_llm_result(state["text"], instruction, edited_text, selected_model, metrics,
+                                intermediates=state.get("intermediates"))
+
+        def on_error(e):
+            self._draft_job = None
+            self._on_llm_error(state.get("text", user_text), str(e))
 
-            self.root.after(0, lambda: self._on_llm_result(user_text, instruction, edited_text))
+        def on_cancel():
+            self._draft_job = None
+            if "text" in state and self._streaming:
+                self._end_stream()
+                self.set_plain_text(state["text"])
+            self._job_finished("Cancelled.")
 
+        job = self.jobs.submit((instruction, selected_model, hash(user_text)), run, prepare=prepare,
+                               on_done=on_done, on_error=on_error, on_cancel=on_cancel)
+        if job is None:
+            self.status_var.set(f"{label or 'This action'} is already queued for this text.")
+            return
         self.set_busy(True)
-        self.status_var.set("Processing with LLMâ€¦")
-        self.status_var.set("Processing with LLM...")
-        threading.Thread(target=worker, daemon=True).start()
+        self.status_var.set(self.busy_status())
 
-    def _on_llm_result(self, user_text, instruction, edited_text):
-        # If it's the first time we are modifying text, create the scratchpad
-        if not self.first_change_time:
-            self.first_change_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.scratchpad_filename = f"TextEnhanceAI-scratchpad_{self.first_change_time}.md"
+    def cancel_jobs(self):
+        """Abort the running request and drop queued ones."""
+        self.jobs.cancel_all()
+        self.status_var.set("Cancelling...")
+
+    def busy_status(self):
+        queued = self.jobs.pending() - 1
+        suffix = f" ({queued} queued)" if queued > 0 else ""
+        return f"Processing with LLM...{suffix}"
+
+    def _job_finished(self, message=None):
+        """Reset the UI once the last queued job is done."""
+        if self.jobs.pending():
+            return
+        self.status_var.set(message or self.ready_status())
+        self.set_busy(False)
+
+    def _queue_stream_update(self, user_text, snapshot):
+        """Called from the worker: schedule a throttled render of the partial output."""
+        with self._stream_lock:
+            self._stream_latest = (user_text, snapshot)
+            if self._stream_scheduled:
+                return
+            self._stream_scheduled = True
+        self.root.after(STREAM_RENDER_INTERVAL_MS, self._flush_stream_update)
+
+    def _flush_stream_update(self):
+        """Render the most recent partial output as an inline diff."""
+        with self._stream_lock:
+            latest = self._stream_latest
+            self._stream_latest = None
+            self._stream_scheduled = False
+        if latest is None or not self._streaming:
+            return
+        user_text, snapshot = latest
+        partial_text = snapshot()
+        self.show_inline_diff(user_text, partial_text, partial=True)
+        self.status_var.set(f"Streaming from LLM... ({len(partial_text)} chars)")
+
+    def _end_stream(self):
+        """Stop rendering partial output; any pending flush becomes a no-op."""
+        self._streaming = False
+        with self._stream_lock:
+            self._stream_latest = None
+
+    def _on_draft_result(self, job, state, instruction, draft_text, draft_model, final_model, draft_metrics):
+        """Show the draft tier's edit while the selected model is still working."""
+        if job.cancelled or self._typing_count != state["typing"]:
+            return
+        self._on_llm_result(state["text"], instruction, draft_text, draft_model, draft_metrics)
+        state["draft_diff"] = self.last_diff
+        # Accepting the draft settles the paragraphs for the selected model's action
+        self._last_pass_key = (instruction, final_model)
+        self.status_var.set(f"Draft by {draft_model} shown; refining with {final_model}...")
+        # The draft can be reviewed now; Cancel stays on for the selected model
+        self._draft_job = job
+        self._set_review_enabled(True)
+
+    def _on_draft_error(self, job, state, draft_model, final_model, error):
+        """Report a failed draft; the selected model's edit still follows."""
+        if job.cancelled:
+            return
+        if self._streaming:
+            # Drop the draft's partial output
+            self._end_stream()
+            self.set_plain_text(state["text"])
+        self.status_var.set(f"Draft by {draft_model} failed ({error}); waiting for {final_model}...")
+
+    def _on_llm_error(self, user_text, message):
+        if self._streaming:
+            # Put the original text back instead of leaving a half-rendered diff
+            self._end_stream()
+            self.set_plain_text(user_text)
+        # Follow-up actions were meant for this result; drop them
+        self.jobs.cancel_all()
+        self._job_finished("Ready")
+        messagebox.showerror("LLM Error", message)
+
+    def _on_llm_result(self, user_text, instruction, edited_text, model=None, metrics=None, intermediates=None):
+        """
+        Show and log a finished edit. intermediates is a list of (stage name,
+        text) pairs from a pipeline; they are logged but not shown.
+        """
+        self._end_stream()
+
+        self._ensure_scratchpad()
+
+        self._last_pass_key = (instruction, model)
+
+        # Diff once; the widget, the scratchpad and Accept/Reject share it
+        diff_start = time.perf_counter()
+        diff = teai_diff.TextDiff(user_text, edited_text)
+        if metrics is not None:
+            metrics.diff_seconds = time.perf_counter() - diff_start
 
         # Show inline diff to the text widget
-        self.show_inline_diff(user_text, edited_text)
+        self.show_inline_diff(
+            user_text, edited_text, diff=diff,
+            on_rendered=(lambda seconds: self._record_metrics(metrics, seconds)) if metrics else None,
+        )
 
         # Log to scratchpad with bold for differences
-        bold_user_text, bold_edited_text = self.generate_bold_diff(user_text, edited_text)
+        bold_user_text, bold_edited_text = self.generate_bold_diff(user_text, edited_text, diff=diff)
+        stage_texts = "".join(
+            f"##After {name}:##\n{text}\n\n" for name, text in intermediates or []
+        )
+        record = {
+            "event": "edit",
+            "instruction": instruction,
+            "model": model,
+            "user_text": user_text,
+            "edited_text": edited_text,
+            "hunks": len(diff.hunks),
+        }
+        if metrics is not None:
+            timings = metrics.as_record()
+            for key in ("prompt", "generation_seconds", "time_to_first_token", "tokens_per_second"):
+                record[key] = timings[key]
+        if intermediates:
+            record["stages"] = [{"prompt": name, "text": text} for name, text in intermediates]
         self.log_to_scratchpad(
             f"#Instruction: {instruction} #\n\n"
             f"##User Text:##\n{bold_user_text}\n\n"
-            f"##Edited Text:##\n{bold_edited_text}\n\n"
+            f"{stage_texts}"
+            f"##Edited Text:##\n{bold_edited_text}\n\n",
+            record=record,
         )
-        self.status_var.set("Ready")
-        self.set_busy(False)
+        self._job_finished()
+
+    def _ensure_scratchpad(self):
+        """If it's the first time we are modifying text, create the scratchpad."""
+        if not self.first_change_time:
+            self.first_change_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+            stem = f"TextEnhanceAI-scratchpad_{self.first_change_time}"
+            self.scratchpad_filename = f"{stem}.md"
+            self.scratchpad = writer_for_session(stem, archive=self.archive)
+
+    def _import_scratchpads(self):
+        """Worker thread: add scratchpad files in the working directory to the archive."""
+        try:
+            added = self.archive.import_paths(glob.glob(SCRATCHPAD_GLOB))
+        except Exception as e:
+            print(f"Scratchpad import failed: {e}")
+            return
+        if added:
+            print(f"Imported {added} past edits into the history archive.")
+
+    def show_history(self):
+        if self.archive is None:
+            messagebox.showinfo("History", "The edit archive is turned off (TEAI_ARCHIVE=0).")
+            return
+        HistoryWindow(self.root, self.archive, self.load_archived_text)
+
+    def load_archived_text(self, text, label):
+        """Replace the editor text with one from the archive; Undo brings the previous text back."""
+        if self.jobs.pending():
+            self.status_var.set("Wait for the running request to finish before loading a past text.")
+            return
+        if not self._diff_is_current():
+            self.history.record(self.get_text_excluding_tag_safe("deletion"), "Typing")
+        self.set_plain_text(text)
+        self.history.record(text, label)
+        self._edited_since_accept = True
+        self.status_var.set(f"Loaded {label}.")
+
+    def _record_metrics(self, metrics, render_seconds):
+        """Log a finished request's timings and show their summary."""
+        metrics.render_seconds = render_seconds
+        self.last_metrics = metrics
+        if self.metrics_log is not None:
+            self.metrics_log.record(metrics)
+        if not self.jobs.pending():
+            self.status_var.set(self.ready_status())
+
+    def ready_status(self):
+        """Status bar text shown when idle: last request's timings, model load state, cache counters."""
+        notes = []
+        if self.last_metrics is not None:
+            notes.append(f"last: {self.last_metrics.summary()}")
+        model_state = self.model_state.get(self.model_var.get())
+        if model_state:
+            notes.append(model_state)
+        if self.response_cache is not None:
+            stats = self.response_cache.stats()
+            notes.append(f"cache: {stats['hits']} hits / {stats['misses']} misses")
+        return "Ready" + (f" ({'; '.join(notes)})" if notes else "")
+
+    def _on_model_state(self, model, state, detail):
+        """Record a ModelWarmer update and show it if the app is idle."""
+        if state == "loading":
+            self.model_state[model] = f"loading {model}..."
+        elif state == "loaded":
+            self.model_state[model] = f"{model} loaded in {detail:.1f} s"
+        else:
+            self.model_state[model] = f"{model} not loaded: {detail}"
+        if not self.jobs.pending():
+            self.status_var.set(self.ready_status())
 
     def set_busy(self, busy: bool):
-        """Enable/disable buttons while background work runs."""
-        state = tk.DISABLED if busy else tk.NORMAL
-        # Top button row
+        """
+        Enable/disable buttons while background work runs. The action buttons
+        stay enabled so that follow-up actions can be queued.
+        """
         try:
-            for w in self.btn_frame.winfo_children():
-                if isinstance(w, tk.Button):
-                    w.config(state=state)
+            self.cancel_btn.config(state=tk.NORMAL if busy else tk.DISABLED)
         except Exception:
             pass
-        # Accept/Reject row
+        self._set_review_enabled(not busy)
+
+    def _set_review_enabled(self, enabled):
+        """Enable/disable the Accept/Reject row (Accept, Reject, Next, Undo, Redo, History)."""
+        state = tk.NORMAL if enabled else tk.DISABLED
         for w in self.accept_reject_frame.winfo_children():
             if isinstance(w, tk.Button):
                 try:
@@ -344,60 +1029,54 @@ class EditorApp:
                 except Exception:
                     pass
 
+    @property
+    def ollama_client(self):
+        """Shared Ollama client; the first access waits for the ollama import."""
+        if self._ollama_client is None:
+            self._ollama_client = teai_models.get_client()
+        return self._ollama_client
+
+    @ollama_client.setter
+    def ollama_client(self, client):
+        self._ollama_client = client
+
+    def _record_startup_time(self):
+        self.startup_seconds = time.perf_counter() - _START_TIME
+        if os.getenv("TEAI_STARTUP_TIMING"):
+            print(f"Startup: window ready in {self.startup_seconds * 1000:.0f} ms")
+
     def get_available_models(self):
-        """Return a list of available local Ollama model names."""
-        models = []
-        # 1) Try official top-level API first
-        if ollama_list is not None:
-            try:
-                resp = ollama_list()
-                # Newer package: ListResponse with .models attribute
-                if hasattr(resp, 'models'):
-                    for m in getattr(resp, 'models') or []:
-                        # objects have .model (name)
-                        name = getattr(m, 'model', None) or getattr(m, 'name', None)
-                        if isinstance(name, str):
-                            models.append(name)
-                # Fallback: dict with 'models'
-                elif isinstance(resp, dict) and 'models' in resp:
-                    for m in resp.get('models') or []:
-                        if isinstance(m, dict):
-                            name = m.get('name') or m.get('model')
-                        else:
-                            name = str(m)
-                        if isinstance(name, str):
-                            models.append(name)
-            except Exception:
-                # ignore and fallback to client
-                pass
-        # 2) Fallback to client.list() if needed
-        if not models and self.ollama_client and hasattr(self.ollama_client, 'list'):
-            try:
-                resp = self.ollama_client.list()
-                items = []
-                if hasattr(resp, 'models'):
-                    items = resp.models  # type: ignore[attr-defined]
-                elif isinstance(resp, dict) and 'models' in resp:
-                    items = resp['models'] or []
-                elif isinstance(resp, list):
-                    items = resp
-                for m in items:
-                    name = None
-                    if isinstance(m, dict):
-                        name = m.get('name') or m.get('model')
-                    else:
-                        name = getattr(m, 'model', None) or getattr(m, 'name', None) or (str(m) if m else None)
-                    if isinstance(name, str):
-                        models.append(name)
-            except Exception:
-                pass
+        """Return a list of available local Ollama model names (blocking)."""
+        models = teai_models.discover_models(self.ollama_client)
         if not models:
             models = [self.model_name]
-        return sorted(set(models))
+        return models
 
     def populate_model_menu(self):
-        """Load models from Ollama and update the dropdown."""
-        models = self.get_available_models()
+        """Load models from Ollama in the background and update the dropdown."""
+        def worker():
+            models = teai_models.discover_models(self.ollama_client)
+            if models:
+                teai_models.save_cached_models(models)
+            self.root.after(0, lambda: self._on_models_refreshed(models))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_models_refreshed(self, models):
+        if models:
+            self._set_model_menu(models)
+        elif not self.jobs.pending():
+            self.status_var.set("Could not reach Ollama; showing the last known models.")
+        # Refresh again once the list is considered stale
+        self._schedule_model_refresh(teai_models.MODELS_TTL)
+
+    def _schedule_model_refresh(self, seconds):
+        if self._models_timer is not None:
+            self.root.after_cancel(self._models_timer)
+        self._models_timer = self.root.after(int(seconds * 1000), self.populate_model_menu)
+
+    def _set_model_menu(self, models):
+        """Replace the model and draft dropdown entries with models."""
         try:
             menu = self.model_optionmenu["menu"]
             menu.delete(0, "end")
@@ -408,92 +1087,239 @@ class EditorApp:
         except Exception:
             if models:
                 self.model_var.set(models[0])
+        try:
+            menu = self.draft_optionmenu["menu"]
+            menu.delete(0, "end")
+            for m in [DRAFT_OFF] + list(models):
+                menu.add_command(label=m, command=lambda v=m: self.draft_var.set(v))
+        except Exception:
+            pass
 
-    def show_inline_diff(self, old_text, new_text):
+    def show_inline_diff(self, old_text, new_text, partial=False, diff=None, on_rendered=None):
         """
-        Compute a diff using difflib and insert inline color-coded changes
-        into the text widget. Deletions in red, additions in green.
+        Insert inline color-coded changes into the text widget.
+        Deletions in red, additions in green.
+
+        Pass a precomputed teai_diff.TextDiff as diff to avoid diffing again.
+        With partial=True, new_text is an incomplete streamed answer: the
+        trailing deletions are original text the model has not reached yet,
+        so they are shown greyed out as pending instead of deleted.
+        on_rendered(seconds) is called once the last slice is inserted, or
+        with None when a newer render or plain text replaces this one first.
         """
+        render_start = time.perf_counter()
+        self._render_generation += 1
         self.text_area.delete("1.0", tk.END)
 
-        # Split on whitespace while keeping the whitespace tokens so that
-        # newline characters and other spacing are preserved in the output
-        old_tokens = re.split(r'(\s+)', old_text)
-        new_tokens = re.split(r'(\s+)', new_text)
-
-        diff = difflib.ndiff(old_tokens, new_tokens)
-
-        for token in diff:
-            # token starts with '  ' (no change), '- ' (deletion), or '+ ' (addition)
-            text = token[2:]
-            if token.startswith("  "):
-                # no change
-                self.text_area.insert(tk.END, text)
-            elif token.startswith("- "):
-                # deletion
-                self.text_area.insert(tk.END, text, ("deletion",))
-            elif token.startswith("+ "):
-                # addition
-                self.text_area.insert(tk.END, text, ("addition",))
-
-        # Tag styles
-        self.text_area.tag_config("deletion", foreground="red")
-        self.text_area.tag_config("addition", foreground="green")
-
-    def generate_bold_diff(self, original_text, edited_text):
+        if diff is None:
+            diff = teai_diff.TextDiff(old_text, new_text)
+        # Runs of unchanged, removed and added text (whitespace included,
+        # so newline characters and other spacing are preserved)
+        segments = list(diff.segments())
+
+        pending_from = len(segments)
+        if partial:
+            while pending_from > 0 and segments[pending_from - 1][0] == "deletion":
+                pending_from -= 1
+
+        # Merge neighbouring runs that end up with the same tags
+        runs = []
+        for n, (tag, text) in enumerate(segments):
+            # trailing original text the stream has not reached yet is pending
+            tags = ("pending",) if n >= pending_from else (tag,) if tag else ()
+            if runs and runs[-1][1] == tags:
+                runs[-1][0].append(text)
+            else:
+                runs.append(([text], tags))
+        runs = [("".join(parts), tags) for parts, tags in runs]
+
+        # Remember the final diff; any later typing sets the modified flag
+        self.last_diff = None if partial else diff
+        self._render_pending = True
+        self._render_slice(self._render_generation, runs, 0, render_start, on_rendered)
+
+    def _render_slice(self, generation, runs, start, render_start=None, on_rendered=None):
+        """Insert the next slice of runs in one Tk call, then yield to the event loop."""
+        if generation != self._render_generation:
+            # Superseded; the request is still logged, without a render time
+            if on_rendered:
+                on_rendered(None)
+            return
+        args = []
+        chars = 0
+        end = start
+        while end < len(runs) and (chars < RENDER_SLICE_CHARS or end == start):
+            text, tags = runs[end]
+            args.extend((text, tags))
+            chars += len(text)
+            end += 1
+        if args:
+            self.text_area.insert(tk.END, *args)
+        if end < len(runs):
+            self.root.after(1, lambda: self._render_slice(generation, runs, end, render_start, on_rendered))
+        else:
+            self._render_pending = False
+            self.text_area.edit_modified(False)
+            if on_rendered:
+                on_rendered(time.perf_counter() - render_start)
+
+    def generate_bold_diff(self, original_text, edited_text, diff=None):
         """
         Generate two strings:
          - In the 'User Text', highlight removed words in bold
          - In the 'Edited Text', highlight added words in bold
+        Reuses diff (a teai_diff.TextDiff) when given.
         """
-        # Preserve whitespace/newlines to retain formatting in scratchpad
-        orig_tokens = re.split(r'(\s+)', original_text)
-        edit_tokens = re.split(r'(\s+)', edited_text)
-
-        diff = difflib.ndiff(orig_tokens, edit_tokens)
-        user_text_bold = []
-        edited_text_bold = []
-
-        for token in diff:
-            text = token[2:]
-            if token.startswith("  "):
-                user_text_bold.append(text)
-                edited_text_bold.append(text)
-            elif token.startswith("- "):
-                # Removed: bold non-whitespace in user view
-                if text.isspace() or text == "":
-                    user_text_bold.append(text)
-                else:
-                    user_text_bold.append(f"**{text}**")
-            elif token.startswith("+ "):
-                # Added: bold non-whitespace in edited view
-                if text.isspace() or text == "":
-                    edited_text_bold.append(text)
-                else:
-                    edited_text_bold.append(f"**{text}**")
-
-        return "".join(user_text_bold), "".join(edited_text_bold)
+        if diff is None:
+            diff = teai_diff.TextDiff(original_text, edited_text)
+        # Whitespace/newlines are preserved to retain formatting in scratchpad
+        return diff.bold_markdown()
 
     # --------------
     # Accept / Reject changes
     # --------------
+    def _can_review(self):
+        """
+        True unless a request is running whose result is not on screen yet;
+        a shown draft can be reviewed while its selected model refines.
+        """
+        pending = self.jobs.pending()
+        return not pending or (pending == 1 and self._draft_job is not None
+                               and self.jobs.current is self._draft_job)
+
     def accept_all_changes(self):
         """Accept all changes by removing diff markup and using the 'plus' words only."""
-        final_text = self.get_text_excluding_tag_safe("deletion")
-        self.text_area.delete("1.0", tk.END)
-        self.text_area.insert("1.0", final_text)
+        if not self._can_review():
+            self.status_var.set("Accept and Reject are available once the running request finishes.")
+            return
+        current = self._diff_is_current()
+        if current:
+            final_text = self.last_diff.new_text
+        else:
+            final_text = self.get_text_excluding_tag_safe("deletion")
+        self.set_plain_text(final_text)
+        self.history.record(final_text, "Accept")
+        # The next run of the same action only needs paragraphs edited after
+        # this; text typed into a stale diff was never sent, so it stays dirty
+        if current:
+            if self._last_pass_key is not None:
+                self.paragraphs.mark_clean(final_text, self._last_pass_key)
+            self._edited_since_accept = False
 
         # Log acceptance
-        self.log_to_scratchpad("User accepted all changes.\n\n")
+        self.log_to_scratchpad("User accepted all changes.\n\n", record={"event": "accept_all"})
 
     def reject_all_changes(self):
         """Reject all changes by removing diff markup and using the 'original' words only."""
-        final_text = self.get_text_excluding_tag_safe("addition")
-        self.text_area.delete("1.0", tk.END)
-        self.text_area.insert("1.0", final_text)
+        if not self._can_review():
+            self.status_var.set("Accept and Reject are available once the running request finishes.")
+            return
+        if self._diff_is_current():
+            final_text = self.last_diff.old_text
+        else:
+            final_text = self.get_text_excluding_tag_safe("addition")
+        self.set_plain_text(final_text)
+        self.history.record(final_text, "Reject")
 
         # Log rejection
-        self.log_to_scratchpad("User rejected all changes.\n\n")
+        self.log_to_scratchpad("User rejected all changes.\n\n", record={"event": "reject_all"})
+
+    # --------------
+    # Undo / Redo
+    # --------------
+    def undo(self, event=None):
+        """Go back to the text before the last typing, accept or reject."""
+        self._step_history(undo=True)
+        return "break"
+
+    def redo(self, event=None):
+        """Restore the revision the last Undo left."""
+        self._step_history(undo=False)
+        return "break"
+
+    def _step_history(self, undo):
+        if not self._can_review():
+            self.status_var.set("Undo and Redo are available once the running request finishes.")
+            return
+        if undo and self._diff_is_current():
+            # Suggested changes on screen: the first Undo only drops them
+            self.set_plain_text(self.history.text)
+            self.status_var.set("Undid the suggested changes.")
+            return
+        if self.text_area.edit_modified():
+            # Typed since the app last set the text; keep it so Redo can return to it
+            if self.last_diff is not None:
+                typed = self.get_text_excluding_tag_safe("deletion")
+            else:
+                typed = self.text_area.get("1.0", "end-1c")
+            self.history.record(typed, "Typing")
+            self.set_plain_text(typed)
+        # The widget holds exactly history.text unless a stale diff is still shown
+        in_place = self.last_diff is None
+        before = self.history.text
+        step = self.history.undo() if undo else self.history.redo()
+        if step is None:
+            self.status_var.set("Nothing to undo." if undo else "Nothing to redo.")
+            return
+        text, edits = step
+        if in_place and len(edits) <= HISTORY_INPLACE_EDITS:
+            # Patch only the changed regions, last first so earlier offsets stay valid
+            for start, end, replacement in reversed(edits):
+                self.text_area.delete(self._tk_index(start, before), self._tk_index(end, before))
+                self.text_area.insert(self._tk_index(start, before), replacement)
+            self.text_area.edit_modified(False)
+        else:
+            self.set_plain_text(text)
+        self._edited_since_accept = True
+
+        label = self.history.label(self.history.index + 1 if undo else None)
+        verb = "undid" if undo else "redid"
+        self.status_var.set(f"{verb.capitalize()} {label} ({self.history.index} of {len(self.history) - 1}).")
+        self.log_to_scratchpad(f"User {verb} {label}.\n\n",
+                               record={"event": "undo" if undo else "redo", "revision": self.history.index})
+
+    def jump_to_next_change(self):
+        """Move the cursor to the next change after it, wrapping to the first one."""
+        if not self._diff_is_current() or not self.last_diff.hunks:
+            return
+        n = self.last_diff.next_hunk(self._char_offset(tk.INSERT))
+        if n is None:
+            n = 0
+        index = self._tk_index(self.last_diff.view_starts[n])
+        self.text_area.mark_set(tk.INSERT, index)
+        self.text_area.see(index)
+        self.text_area.focus_set()
+
+    def _diff_is_current(self):
+        """True if the widget still shows the last rendered diff untouched."""
+        if self.last_diff is None:
+            return False
+        if self._render_pending:
+            # Still inserting slices; the widget holds our own text
+            return True
+        try:
+            return not self.text_area.edit_modified()
+        except Exception:
+            return False
+
+    def _on_text_modified(self, event=None):
+        """<<Modified>> handler: note typing, ignoring the app's own inserts."""
+        if self.text_area.edit_modified() and not self._render_pending:
+            self._edited_since_accept = True
+            self._typing_count += 1
+            if self._streaming:
+                # Stop rendering partial output over what the user is typing
+                self._end_stream()
+                self.status_var.set("Text changed during processing; the result will be discarded.")
+
+    def set_plain_text(self, text):
+        """Replace the widget content with plain text and drop the retained diff."""
+        self._render_generation += 1
+        self._render_pending = False
+        self.text_area.delete("1.0", tk.END)
+        self.text_area.insert("1.0", text)
+        self.text_area.edit_modified(False)
+        self.last_diff = None
 
     def get_text_excluding_tag(self, tag):
         """
@@ -519,27 +1345,53 @@ class EditorApp:
     # --------------
     # Logging / Scratchpad
     # --------------
-    def log_to_scratchpad(self, *texts):
-        """Write changes and actions to the scratchpad file."""
-        if not self.scratchpad_filename:
+    def log_to_scratchpad(self, *texts, record=None):
+        """
+        Queue changes and actions for the scratchpad files. The Markdown text
+        and the optional JSONL record are written by a background thread.
+        """
+        if not self.scratchpad:
             return
-        with open(self.scratchpad_filename, "a", encoding="utf-8") as f:
-            for text in texts:
-                f.write(text)
-            f.write("\n")
+        self.scratchpad.write("".join(texts) + "\n", record)
+
+    def shutdown(self):
+        """Flush pending scratchpad and metrics writes before the process exits."""
+        if self.scratchpad:
+            self.scratchpad.close()
+        if self.metrics_log is not None:
+            self.metrics_log.close()
+        # After the scratchpad, whose writer thread feeds the archive
+        if self.archive is not None:
+            self.archive.close()
 
     def get_text_excluding_tag_safe(self, tag):
-        """Rebuild text while excluding characters belonging to a given tag."""
+        """
+        Rebuild text while excluding characters belonging to a given tag.
+
+        Reads the text between the tag's ranges with one get() each, so the
+        number of Tk calls grows with the number of ranges, not with the text
+        length, and all positions stay Tk indices.
+        """
+        ranges = self.text_area.tag_ranges(tag)
         result = []
-        idx = "1.0"
-        end_idx = self.text_area.index("end-1c")
-        while self.text_area.compare(idx, "<", end_idx):
-            char = self.text_area.get(idx)
-            current_tags = self.text_area.tag_names(idx)
-            if tag not in current_tags:
-                result.append(char)
-            idx = self.text_area.index(f"{idx}+1c")
+        pos = "1.0"
+        for start, end in zip(ranges[0::2], ranges[1::2]):
+            result.append(self.text_area.get(pos, start))
+            pos = end
+        result.append(self.text_area.get(pos, "end-1c"))
         return "".join(result)
+
+    def _tk_index(self, offset, text=None):
+        """Tk index of Python offset in text, which the widget holds (read if not given)."""
+        if self._tk_wide_chars:
+            if text is None:
+                text = self.text_area.get("1.0", "end-1c")
+            offset += len(NON_BMP.findall(text, 0, offset))
+        return f"1.0 + {offset} chars"
+
+    def _char_offset(self, index):
+        """Python offset of Tk index in the widget's text."""
+        return len(self.text_area.get("1.0", index))
 
 
 # --------------
@@ -549,4 +1401,5 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = EditorApp(root)
     root.mainloop()
+    app.shutdown()
 
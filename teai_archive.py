@@ -0,0 +1,438 @@
+"""
+Searchable archive of the edits made with TextEnhanceAI.
+
+Every edit and translation (instruction, model, original and edited text,
+number of changes, timings and whether it was accepted) is stored in one
+SQLite database, TEAI_ARCHIVE_PATH (default
+~/.local/share/TextEnhanceAI/history.sqlite3). An FTS5 index over the
+instruction and both texts keeps searches fast as the archive grows to tens
+of thousands of edits. The editor feeds it from the scratchpad writer thread;
+existing scratchpad files (.md, .jsonl and their rotated .gz parts) are
+imported once.
+
+Examples:
+    python teai_archive.py search "quarterly report" --prompt Polish --since 2025-06-01
+    python teai_archive.py show 1234
+    python teai_archive.py import ~/notes/TextEnhanceAI-scratchpad_*
+    python teai_archive.py stats
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from teai_llm import PROMPTS, translate_instruction
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".local", "share", "TextEnhanceAI", "history.sqlite3")
+# Scratchpad files the editor creates in its working directory
+SCRATCHPAD_GLOB = "TextEnhanceAI-scratchpad_*"
+
+_SESSION = re.compile(r"(TextEnhanceAI-scratchpad_(\d{8})_(\d{6}))")
+_HEADING = re.compile(r"^#(Instruction|Translation): (.*) #$", re.MULTILINE)
+_EVENT_LINE = re.compile(r"^User (accepted all changes|rejected all changes|undid .*|redid .*)\.$", re.MULTILINE)
+_BOLD = re.compile(r"\*\*(\S+?)\*\*")
+# Instructions of the built-in actions, translations and pipelines ("Pipeline <name>: <stages>")
+_PROMPT_NAMES = {instruction: name for name, instruction in PROMPTS.items()}
+_TRANSLATE_PREFIX, _, _TRANSLATE_SUFFIX = translate_instruction("\0").partition("\0")
+_PIPELINE = re.compile(r"^Pipeline (.+): [^:]+$")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS edits ("
+    "id INTEGER PRIMARY KEY, time TEXT NOT NULL, session TEXT, kind TEXT NOT NULL, "
+    "prompt TEXT, instruction TEXT, model TEXT, user_text TEXT NOT NULL, edited_text TEXT NOT NULL, "
+    "hunks INTEGER, generation_seconds REAL, time_to_first_token REAL, tokens_per_second REAL, "
+    "outcome TEXT, source TEXT)",
+    "CREATE INDEX IF NOT EXISTS edits_time ON edits(time)",
+    "CREATE INDEX IF NOT EXISTS edits_session ON edits(session, id)",
+    "CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, edits INTEGER)",
+]
+# Only outcome is ever updated, and it is not indexed, so inserts and deletes suffice
+_FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS edits_fts USING fts5("
+    "instruction, user_text, edited_text, content='edits', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS edits_fts_insert AFTER INSERT ON edits BEGIN "
+    "INSERT INTO edits_fts(rowid, instruction, user_text, edited_text) "
+    "VALUES (new.id, new.instruction, new.user_text, new.edited_text); END",
+    "CREATE TRIGGER IF NOT EXISTS edits_fts_delete AFTER DELETE ON edits BEGIN "
+    "INSERT INTO edits_fts(edits_fts, rowid, instruction, user_text, edited_text) "
+    "VALUES ('delete', old.id, old.instruction, old.user_text, old.edited_text); END",
+]
+_COLUMNS = ("id", "time", "session", "kind", "prompt", "instruction", "model", "hunks",
+            "generation_seconds", "time_to_first_token", "tokens_per_second", "outcome", "source")
+_OUTCOMES = {"accept_all": "accepted", "reject_all": "rejected"}
+
+
+# --------------
+# Scratchpad parsing
+# --------------
+def session_of(path):
+    """Return (session name, ISO start time or None) for a scratchpad file path."""
+    match = _SESSION.search(os.path.basename(path))
+    if not match:
+        return os.path.basename(path).split(".")[0], None
+    day, clock = match.group(2), match.group(3)
+    return match.group(1), f"{day[:4]}-{day[4:6]}-{day[6:]}T{clock[:2]}:{clock[2:4]}:{clock[4:]}"
+
+
+def _read(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _is_jsonl(path):
+    return re.search(r"\.jsonl(\.gz)?$", path) is not None
+
+
+def _unbold(text):
+    return _BOLD.sub(r"\1", text).strip("\n")
+
+
+def prompt_name(instruction):
+    """
+    The action that sent instruction, as the editor names it in records: a
+    PROMPTS name, "Translate", a pipeline's name or "Custom".
+    """
+    if not instruction:
+        return None
+    if instruction in _PROMPT_NAMES:
+        return _PROMPT_NAMES[instruction]
+    if instruction.startswith(_TRANSLATE_PREFIX) and instruction.endswith(_TRANSLATE_SUFFIX):
+        return "Translate"
+    match = _PIPELINE.match(instruction)
+    if match:
+        return match.group(1)
+    return "Custom"
+
+
+def parse_markdown(text):
+    """
+    Return the records of a Markdown scratchpad: edits, translations and the
+    accept/reject lines that followed them. The original and edited texts are
+    recovered by removing the bold change markers.
+    """
+    records = []
+    headings = list(_HEADING.finditer(text))
+    for n, heading in enumerate(headings):
+        end = headings[n + 1].start() if n + 1 < len(headings) else len(text)
+        body = text[heading.end():end]
+        events = list(_EVENT_LINE.finditer(body))
+        if events:
+            body = body[:events[0].start()]
+        if heading.group(1) == "Translation":
+            records.append({"event": "translate", "language": heading.group(2), "user_text": "",
+                            "edited_text": body.strip("\n")})
+        else:
+            user, sep, rest = body.partition("##User Text:##\n")
+            before, sep2, edited = rest.partition("##Edited Text:##\n")
+            if not sep or not sep2:
+                continue
+            # Pipelines log "##After <stage>:##" sections between the two texts
+            user_text = re.split(r"\n\n##After [^\n]*:##\n", before)[0]
+            records.append({"event": "edit", "instruction": heading.group(2),
+                            "user_text": _unbold(user_text), "edited_text": _unbold(edited)})
+        for event in events:
+            line = event.group(1)
+            if line.startswith("accepted"):
+                records.append({"event": "accept_all"})
+            elif line.startswith("rejected"):
+                records.append({"event": "reject_all"})
+    return records
+
+
+def parse_jsonl(text):
+    records = []
+    for line in text.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
+
+
+def _match_query(query):
+    """Quote each word so punctuation in a search is not read as FTS syntax."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+class EditArchive:
+    """
+    The edit archive database. Safe to share between threads; writes from the
+    scratchpad thread and reads from the UI thread are serialised by a lock.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        # Without FTS5 in this SQLite build, searches fall back to LIKE scans
+        try:
+            for statement in _FTS_SCHEMA:
+                self._db.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --------------
+    # Writing
+    # --------------
+    def add_records(self, records, session=None, source=None, default_time=None):
+        """
+        Store scratchpad records in one transaction: "edit" and "translate"
+        records become rows, "accept_all" / "reject_all" set the outcome of
+        the session's latest edit. Other events are ignored. Records without
+        a prompt (Markdown and older scratchpads) get it from their
+        instruction. Returns the number of edits added.
+        """
+        added = 0
+        with self._lock:
+            if self._db is None:
+                return 0
+            try:
+                for record in records:
+                    event = record.get("event")
+                    if event in _OUTCOMES:
+                        self._db.execute(
+                            "UPDATE edits SET outcome = ? WHERE id = "
+                            "(SELECT MAX(id) FROM edits WHERE session IS ? AND kind = 'edit')",
+                            (_OUTCOMES[event], session),
+                        )
+                        continue
+                    if event not in ("edit", "translate") or "edited_text" not in record:
+                        continue
+                    language = record.get("language")
+                    instruction = record.get("instruction")
+                    if not instruction and language:
+                        instruction = f"Translate into {language}"
+                    prompt = record.get("prompt")
+                    if not prompt:
+                        prompt = "Translate" if event == "translate" else prompt_name(instruction)
+                    self._db.execute(
+                        "INSERT INTO edits (time, session, kind, prompt, instruction, model, user_text, "
+                        "edited_text, hunks, generation_seconds, time_to_first_token, tokens_per_second, "
+                        "source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            record.get("time") or default_time or time.strftime("%Y-%m-%dT%H:%M:%S"),
+                            session,
+                            event,
+                            prompt,
+                            instruction,
+                            record.get("model"),
+                            record.get("user_text") or "",
+                            record["edited_text"],
+                            record.get("hunks"),
+                            record.get("generation_seconds"),
+                            record.get("time_to_first_token"),
+                            record.get("tokens_per_second"),
+                            source,
+                        ),
+                    )
+                    added += 1
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                print(f"Edit archive write failed: {e}")
+                return 0
+        return added
+
+    def import_paths(self, paths):
+        """
+        Import the scratchpad files among paths that were not imported
+        before. When a session has both .jsonl and .md files only the JSON
+        lines are read. Returns the number of edits added.
+        """
+        by_session = {}
+        for path in sorted(set(os.path.abspath(p) for p in paths)):
+            if os.path.isfile(path) and re.search(r"\.(md|jsonl)(\.gz)?$", path):
+                by_session.setdefault(session_of(path)[0], []).append(path)
+        added = 0
+        for files in by_session.values():
+            if any(_is_jsonl(p) for p in files):
+                files = [p for p in files if _is_jsonl(p)]
+            # Rotated parts (<stem>.<n>.md.gz) hold older entries than the live file
+            files.sort(key=lambda p: (not p.endswith(".gz"), p))
+            for path in files:
+                added += self.import_file(path)
+        return added
+
+    def import_file(self, path):
+        """
+        Import one scratchpad file; returns the edits added. Files imported
+        before are skipped, and so are sessions the editor wrote to the
+        archive itself or that were imported from the other format.
+        """
+        path = os.path.abspath(path)
+        session, start = session_of(path)
+        with self._lock:
+            done = self._db.execute("SELECT 1 FROM imports WHERE path = ?", (path,)).fetchone()
+            sources = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT source FROM edits WHERE session = ?", (session,))]
+        if done is not None:
+            return 0
+        added = 0
+        if not any(s is None or _is_jsonl(s) != _is_jsonl(path) for s in sources):
+            try:
+                text = _read(path)
+            except OSError as e:
+                print(f"Could not import {path}: {e}")
+                return 0
+            records = parse_jsonl(text) if _is_jsonl(path) else parse_markdown(text)
+            added = self.add_records(records, session=session, source=path, default_time=start)
+        stat = os.stat(path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO imports (path, size, mtime, edits) VALUES (?, ?, ?, ?)",
+                             (path, stat.st_size, stat.st_mtime, added))
+            self._db.commit()
+        return added
+
+    # --------------
+    # Reading
+    # --------------
+    def search(self, query="", model=None, prompt=None, since=None, limit=100):
+        """
+        Return the newest edits matching every word of query (in the
+        instruction, original or edited text) and the filters, as dicts with
+        a short "snippet" around the match.
+        """
+        where, filters = [], []
+        if model:
+            where.append("e.model = ?")
+            filters.append(model)
+        if prompt:
+            where.append("e.prompt = ?")
+            filters.append(prompt)
+        if since:
+            where.append("e.time >= ?")
+            filters.append(since)
+        columns = ", ".join(f"e.{c}" for c in _COLUMNS)
+        # The snippet is cut around the first word, in the edited text if it is there
+        word = (query.split() or [""])[0].lower()
+        snippet = ("CASE WHEN instr(lower(e.edited_text), ?) > 0 "
+                   "THEN substr(e.edited_text, max(instr(lower(e.edited_text), ?) - 40, 1), 120) "
+                   "ELSE substr(e.user_text, max(instr(lower(e.user_text), ?) - 40, 1), 120) END AS snippet")
+        params = [word] * 3
+        if query.strip() and self.fts:
+            # Walking the index by rowid lets LIMIT stop early, newest first
+            sql = (f"SELECT {columns}, {snippet} FROM edits_fts JOIN edits e ON e.id = edits_fts.rowid "
+                   "WHERE edits_fts MATCH ?")
+            params.append(_match_query(query))
+            order = "edits_fts.rowid"
+        else:
+            sql = f"SELECT {columns}, {snippet} FROM edits e WHERE 1"
+            for term in query.split():
+                where.append("(e.instruction LIKE ? OR e.user_text LIKE ? OR e.edited_text LIKE ?)")
+                filters.extend([f"%{term}%"] * 3)
+            order = "e.id"
+        params.extend(filters)
+        sql += "".join(f" AND {clause}" for clause in where) + f" ORDER BY {order} DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def get(self, edit_id):
+        """Return one edit with its texts as a dict, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM edits WHERE id = ?", (edit_id,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self):
+        """Counts for display: edits, sessions, imported files, first and last time."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT session), MIN(time), MAX(time) FROM edits").fetchone()
+            imported = self._db.execute("SELECT COUNT(*) FROM imports").fetchone()[0]
+        return {"edits": row[0], "sessions": row[1], "first": row[2], "last": row[3],
+                "imported_files": imported, "full_text_index": self.fts}
+
+
+def archive_from_env():
+    """Open the archive configured by TEAI_ARCHIVE / TEAI_ARCHIVE_PATH, or None."""
+    if os.getenv("TEAI_ARCHIVE", "1") == "0":
+        return None
+    try:
+        return EditArchive(os.getenv("TEAI_ARCHIVE_PATH", DEFAULT_PATH))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Edit archive disabled: {e}")
+        return None
+
+
+# --------------
+# Command line
+# --------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Search the TextEnhanceAI edit archive.")
+    parser.add_argument("--db", default=os.getenv("TEAI_ARCHIVE_PATH", DEFAULT_PATH),
+                        help="Archive database (default: TEAI_ARCHIVE_PATH or %(default)s).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="List the newest edits matching words.")
+    search.add_argument("query", nargs="*", help="Words that must all appear in the instruction or texts.")
+    search.add_argument("--model", help="Only edits made with this model.")
+    search.add_argument("--prompt", help="Only edits made with this action, e.g. Polish.")
+    search.add_argument("--since", help="Only edits at or after this date, e.g. 2025-06-01.")
+    search.add_argument("-n", "--limit", type=int, default=20, help="Maximum results (default: 20).")
+    search.add_argument("--json", action="store_true", help="Print the results as JSON lines.")
+    show = commands.add_parser("show", help="Print one edit with its original and edited text.")
+    show.add_argument("id", type=int)
+    imp = commands.add_parser("import", help="Import scratchpad files (.md, .jsonl, .gz) not imported yet.")
+    imp.add_argument("paths", nargs="*", default=[SCRATCHPAD_GLOB],
+                     help=f"Files or glob patterns (default: {SCRATCHPAD_GLOB}).")
+    commands.add_parser("stats", help="Show archive totals.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    archive = EditArchive(args.db)
+    try:
+        if args.command == "search":
+            for row in archive.search(" ".join(args.query), model=args.model, prompt=args.prompt,
+                                      since=args.since, limit=args.limit):
+                if args.json:
+                    print(json.dumps(row, ensure_ascii=False))
+                    continue
+                snippet = " ".join((row["snippet"] or "").split())
+                print(f"{row['id']:>6}  {row['time']}  {row['prompt'] or row['kind']:<12} "
+                      f"{row['model'] or '':<16} {row['outcome'] or '':<8}  {snippet}")
+        elif args.command == "show":
+            row = archive.get(args.id)
+            if row is None:
+                print(f"No edit {args.id}.", file=sys.stderr)
+                return 1
+            print(f"#{row['id']} {row['time']} {row['prompt'] or row['kind']} with {row['model']}"
+                  f" ({row['hunks']} changes, {row['outcome'] or 'no decision'})\n")
+            print(f"Instruction: {row['instruction']}\n\n--- Original ---\n{row['user_text']}\n\n"
+                  f"--- Edited ---\n{row['edited_text']}")
+        elif args.command == "import":
+            paths = [p for pattern in args.paths for p in (glob.glob(pattern) or [pattern])]
+            print(f"Imported {archive.import_paths(paths)} edits.")
+        else:
+            for key, value in archive.stats().items():
+                print(f"{key}: {value}")
+    finally:
+        archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Headless batch mode for TextEnhanceAI.
+
+Runs one of the editor's prompts (or a custom instruction) over many files
+through a pool of concurrent Ollama requests, writing the edited files and a
+Markdown diff report for each into an output directory. Re-running the same
+command skips files whose outputs are already current.
+
+Example:
+    python teai_batch.py --prompt Proofread "docs/**/*.md" --out edited --jobs 4
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import teai_diff
+import teai_llm
+from teai_cache import cache_from_env
+from teai_pipelines import format_stages, load_pipelines, parse_stages
+
+MANIFEST_NAME = ".teai_batch.json"
+
+
+def run_key(model, instruction):
+    """Identify the settings an output was produced with."""
+    return hashlib.sha256(f"{model}\n{teai_llm.SYSTEM_PROMPT}\n{instruction}".encode("utf-8")).hexdigest()
+
+
+def expand_inputs(patterns, out_dir=None):
+    """
+    Return the sorted, de-duplicated files matching the glob patterns,
+    leaving out everything under out_dir and .diff.md reports so that a
+    re-run does not edit its own output.
+    """
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            path = os.path.abspath(path)
+            if not os.path.isfile(path) or path.endswith(".diff.md"):
+                continue
+            if out_dir and os.path.commonpath([path, out_dir]) == out_dir:
+                continue
+            files.add(path)
+    return sorted(files)
+
+
+def output_paths(path, root, out_dir):
+    """Return (relative name, edited file path, report path) for one input."""
+    rel = os.path.relpath(path, root)
+    if rel.startswith(os.pardir):
+        rel = os.path.basename(path)
+    edited = os.path.join(out_dir, rel)
+    return rel, edited, edited + ".diff.md"
+
+
+def format_report(rel, instruction, model, diff, seconds):
+    """Markdown diff report in the scratchpad layout."""
+    bold_user_text, bold_edited_text = diff.bold_markdown()
+    return (
+        f"#File: {rel} #\n\n"
+        f"#Instruction: {instruction} #\n\n"
+        f"Model: {model} - {len(diff.hunks)} changes - {seconds:.1f} s\n\n"
+        f"##User Text:##\n{bold_user_text}\n\n"
+        f"##Edited Text:##\n{bold_edited_text}\n\n"
+    )
+
+
+class Manifest:
+    """Source hash and settings of every finished output, saved after each file."""
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_current(self, rel, source_hash, key, edited_path):
+        entry = self.entries.get(rel)
+        return (
+            entry is not None
+            and entry.get("source") == source_hash
+            and entry.get("key") == key
+            and os.path.exists(edited_path)
+        )
+
+    def record(self, rel, source_hash, key):
+        with self._lock:
+            self.entries[rel] = {"source": source_hash, "key": key}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def process_file(client, model, instruction, path, root, out_dir, manifest, key,
+                 cache=None, chunk_workers=1, report=True, force=False, stages=None):
+    """
+    Edit one file. Returns (status, characters read, seconds). With stages
+    (a list of instructions) the file goes through each in turn and
+    instruction only describes the pipeline.
+    """
+    rel, edited_path, report_path = output_paths(path, root, out_dir)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    source_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if not force and manifest.is_current(rel, source_hash, key, edited_path):
+        return "skipped", len(text), 0.0
+
+    start = time.perf_counter()
+    if text.strip():
+        edited = teai_llm.edit_pipeline(client, model, stages or [instruction], text.strip(),
+                                        max_workers=chunk_workers, cache=cache)[-1]
+    else:
+        edited = text
+    seconds = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(edited_path) or ".", exist_ok=True)
+    with open(edited_path, "w", encoding="utf-8") as f:
+        f.write(edited + ("\n" if text.endswith("\n") and not edited.endswith("\n") else ""))
+    if report:
+        diff = teai_diff.TextDiff(text.strip(), edited)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(format_report(rel, instruction, model, diff, seconds))
+    manifest.record(rel, source_hash, key)
+    return "edited", len(text), seconds
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Edit many files with a local Ollama model, without the GUI.")
+    what = parser.add_mutually_exclusive_group(required=True)
+    what.add_argument("--prompt", choices=sorted(teai_llm.PROMPTS), help="Built-in editing action.")
+    what.add_argument("--instruction", help="Custom instruction.")
+    what.add_argument("--translate", metavar="LANGUAGE",
+                      help="Translate into LANGUAGE; several comma-separated languages are "
+                           "translated concurrently into one subdirectory each.")
+    what.add_argument("--pipeline", metavar="PIPELINE",
+                      help="Saved pipeline name, or stages such as 'Grammar > Concise > Polish'.")
+    parser.add_argument("inputs", nargs="+", help="Input files or glob patterns (** is recursive).")
+    parser.add_argument("-o", "--out", required=True, help="Output directory.")
+    parser.add_argument("-j", "--jobs", type=int, default=teai_llm.NUM_PARALLEL,
+                        help="Files processed concurrently (default: TEAI_NUM_PARALLEL).")
+    parser.add_argument("--chunk-jobs", type=int, default=1,
+                        help="Concurrent chunk requests within one file (default: 1).")
+    parser.add_argument("--model", default=os.getenv("TEAI_MODEL", "llama3.1:8b"),
+                        help="Ollama model (default: TEAI_MODEL or llama3.1:8b).")
+    parser.add_argument("--host", default=None, help="Ollama host, e.g. http://localhost:11434.")
+    parser.add_argument("--root", default=os.getcwd(),
+                        help="Input paths are mirrored relative to this directory (default: cwd).")
+    parser.add_argument("--no-report", action="store_true", help="Do not write .diff.md reports.")
+    parser.add_argument("--force", action="store_true", help="Re-edit files even if outputs are current.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stages = None
+    languages = []
+    if args.pipeline:
+        try:
+            stage_names = load_pipelines().get(args.pipeline) or parse_stages(args.pipeline)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        instruction = f"Pipeline: {format_stages(stage_names)}"
+        stages = [teai_llm.PROMPTS[name] for name in stage_names]
+    elif args.prompt:
+        instruction = teai_llm.PROMPTS[args.prompt]
+    elif args.translate:
+        languages = list(dict.fromkeys(l.strip() for l in args.translate.split(",") if l.strip()))
+        instruction = teai_llm.translate_instruction(languages[0] if languages else args.translate)
+    else:
+        instruction = args.instruction
+
+    out_dir = os.path.abspath(args.out)
+    files = expand_inputs(args.inputs, out_dir)
+    if not files:
+        print("No input files matched.", file=sys.stderr)
+        return 1
+
+    try:
+        from ollama import Client
+    except ImportError:
+        print("Please install the ollama package (pip install ollama).", file=sys.stderr)
+        return 1
+    client = Client(host=args.host) if args.host else Client()
+    cache = cache_from_env()
+    # (label, instruction, output directory); one per language when translating into several
+    targets = [("", instruction, out_dir)]
+    if len(languages) > 1:
+        targets = [(f"{language}: ", teai_llm.translate_instruction(language),
+                    os.path.join(out_dir, re.sub(r"[^\w-]+", "_", language)))
+                   for language in languages]
+    manifests = {}
+    for _, _, target_dir in targets:
+        os.makedirs(target_dir, exist_ok=True)
+        manifests[target_dir] = Manifest(target_dir)
+    root = os.path.abspath(args.root)
+    total = len(files) * len(targets)
+
+    counts = {"edited": 0, "skipped": 0, "failed": 0}
+    chars_edited = 0
+    busy_seconds = 0.0
+    started = time.perf_counter()
+    # Every (target, file) pair shares one pool, so several languages run concurrently
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {}
+        for label, target_instruction, target_dir in targets:
+            key = run_key(args.model, "\n".join(stages) if stages else target_instruction)
+            for path in files:
+                future = pool.submit(process_file, client, args.model, target_instruction, path, root,
+                                     target_dir, manifests[target_dir], key, cache,
+                                     max(1, args.chunk_jobs), not args.no_report, args.force, stages)
+                futures[future] = label + path
+        for n, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                status, chars, seconds = future.result()
+            except Exception as e:
+                status, chars, seconds = "failed", 0, 0.0
+                print(f"[{n}/{total}] FAILED {path}: {e}", file=sys.stderr)
+            else:
+                print(f"[{n}/{total}] {status} {path} ({seconds:.1f} s)")
+            counts[status] += 1
+            if status == "edited":
+                chars_edited += chars
+                busy_seconds += seconds
+    wall = time.perf_counter() - started
+
+    print(
+        f"\n{counts['edited']} edited, {counts['skipped']} skipped, {counts['failed']} failed "
+        f"in {wall:.1f} s"
+    )
+    if counts["edited"]:
+        print(
+            f"Throughput: {counts['edited'] / wall:.2f} files/s, {chars_edited / wall:.0f} chars/s "
+            f"(mean {busy_seconds / counts['edited']:.1f} s per file, concurrency {args.jobs})"
+        )
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits / {stats['misses']} misses")
+        cache.close()
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
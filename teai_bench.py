@@ -0,0 +1,259 @@
+"""
+Benchmarks for TextEnhanceAI's own overhead, with teai_fake standing in for Ollama.
+
+Synthetic documents of each size go through the pipeline: chunked LLM
+requests to the fake client, diff, bold Markdown diff, partial accept and
+scratchpad logging. When a display is available the same documents also go
+through a hidden editor window: queued request, rendering the inline diff,
+reading text back from the widget (get_text_excluding_tag_safe) and
+Accept/Reject All. Results are printed as JSON with timings in seconds and
+peak Python memory per size, so changes can be compared with numbers.
+
+Example:
+    python teai_bench.py --sizes 1k,100k,1m,5m --pattern typos --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Keep the benchmark away from the user's cache, logs and edit archive
+os.environ.setdefault("TEAI_CACHE", "0")
+os.environ.setdefault("TEAI_METRICS_LOG", "")
+os.environ.setdefault("TEAI_ARCHIVE", "0")
+
+import teai_diff
+import teai_llm
+import teai_models
+from teai_fake import PATTERNS, FakeClient, synthetic_document
+from teai_metrics import RequestMetrics
+from teai_scratchpad import ScratchpadWriter
+
+DEFAULT_SIZES = "1k,10k,100k,1m,5m"
+INSTRUCTION = teai_llm.PROMPTS["Proofread"]
+MODEL = "fake:latest"
+
+
+def parse_size(value):
+    """'1k' -> 1024, '5m' -> 5 * 1024 * 1024, '300' -> 300."""
+    value = value.strip().lower()
+    scale = {"k": 1024, "m": 1024 * 1024}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * scale)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# --------------
+# Pipeline without the GUI
+# --------------
+def run_pipeline(client, text, workdir, stream=False):
+    """Run one document through the non-GUI stages. Returns (timings, info)."""
+    timings = {}
+    metrics = RequestMetrics(MODEL, "Bench")
+    metrics.start()
+    edited, timings["llm"] = _timed(teai_llm.edit_document, client, MODEL, INSTRUCTION, text,
+                                    stream=stream, metrics=metrics)
+    metrics.finish()
+    timings["first_token"] = metrics.time_to_first_token
+    diff, timings["diff"] = _timed(teai_diff.TextDiff, text, edited)
+    (bold_old, bold_new), timings["bold"] = _timed(diff.bold_markdown)
+    # Accept every other change, as a user stepping through them might
+    _, timings["partial_accept"] = _timed(diff.apply, set(range(0, len(diff.hunks), 2)))
+
+    writer = ScratchpadWriter(md_path=os.path.join(workdir, "bench.md"),
+                              jsonl_path=os.path.join(workdir, "bench.jsonl"))
+    start = time.perf_counter()
+    writer.write(
+        f"#Instruction: {INSTRUCTION} #\n\n##User Text:##\n{bold_old}\n\n##Edited Text:##\n{bold_new}\n\n",
+        record={"event": "edit", "user_text": text, "edited_text": edited, "hunks": len(diff.hunks)},
+    )
+    timings["scratchpad_queue"] = time.perf_counter() - start
+    writer.close()
+    timings["scratchpad_flush"] = time.perf_counter() - start
+    info = {"edited_chars": len(edited), "tokens": len(diff.old_tokens), "hunks": len(diff.hunks)}
+    return timings, info
+
+
+def peak_memory(client, text, workdir, stream=False):
+    """Peak Python heap (bytes) while running the non-GUI pipeline once."""
+    tracemalloc.start()
+    try:
+        run_pipeline(client, text, workdir, stream)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# --------------
+# Pipeline through the editor window
+# --------------
+def open_editor(workdir):
+    """Create a hidden EditorApp, or return (None, reason) without a display."""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return None, str(e)
+    root.withdraw()
+    # Model list cache and scratchpads go to the scratch directory
+    teai_models.DEFAULT_CACHE_PATH = os.path.join(workdir, "models.json")
+    import TextEnhanceAI
+    return TextEnhanceAI.EditorApp(root), None
+
+
+def _pump(app, done, timeout=600.0):
+    """Run the Tk event loop until done() is true."""
+    end = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > end:
+            raise TimeoutError("editor did not finish in time")
+        app.root.update()
+        time.sleep(0.0005)
+
+
+def run_editor(app, text, stream=False):
+    """Run one document through the editor window. Returns timings."""
+    timings = {}
+    app.stream_var.set(stream)
+    app.set_plain_text(text)
+    app.last_metrics = None
+    start = time.perf_counter()
+    app.start_llm_task(text, INSTRUCTION, label="Bench")
+    _pump(app, lambda: app.last_metrics is not None and not app.jobs.pending())
+    timings["request_to_screen"] = time.perf_counter() - start
+    metrics = app.last_metrics
+    timings["queue_wait"] = metrics.queue_wait
+    timings["first_token"] = metrics.time_to_first_token
+    timings["llm"] = metrics.generation_seconds
+    timings["diff"] = metrics.diff_seconds
+    timings["render"] = metrics.render_seconds
+    diff = app.last_diff
+
+    new_text, timings["extract_new_text"] = _timed(app.get_text_excluding_tag_safe, "deletion")
+    timings["extract_matches"] = new_text == diff.new_text
+    _, timings["accept_all"] = _timed(app.accept_all_changes)
+
+    rendered = []
+    app.show_inline_diff(diff.old_text, diff.new_text, diff=diff, on_rendered=rendered.append)
+    _pump(app, lambda: rendered)
+    timings["render_again"] = rendered[0]
+    _, timings["reject_all"] = _timed(app.reject_all_changes)
+
+    # Flush this document's scratchpad; the next run starts a new one
+    if app.scratchpad:
+        _, timings["scratchpad_flush"] = _timed(app.scratchpad.close)
+    app.scratchpad = None
+    app.first_change_time = None
+    return timings
+
+
+def _median(runs):
+    """Per-key median over repeated runs (non-numeric values from the first run)."""
+    merged = {}
+    for key, value in runs[0].items():
+        values = [r[key] for r in runs if isinstance(r.get(key), (int, float)) and not isinstance(r.get(key), bool)]
+        merged[key] = round(statistics.median(values), 6) if len(values) == len(runs) else value
+    return merged
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark TextEnhanceAI against a fake Ollama.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated document sizes, k/m suffixes allowed (default: {DEFAULT_SIZES}).")
+    parser.add_argument("--pattern", choices=PATTERNS, default="typos", help="How the fake model edits text.")
+    parser.add_argument("--rate", type=float, default=0.05, help="Share of words changed (default: 0.05).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Fake generation speed (0 = instant).")
+    parser.add_argument("--stream", action="store_true", help="Stream responses, as the editor does by default.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; medians are reported (default: 3).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for documents and edits.")
+    parser.add_argument("--no-gui", action="store_true", help="Skip the editor window stages.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced peak-memory run.")
+    parser.add_argument("-o", "--out", help="Write the JSON results here instead of stdout.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    client = FakeClient(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                        pattern=args.pattern, rate=args.rate, seed=args.seed, models=[MODEL])
+    teai_models.use_client(client)
+    workdir = tempfile.mkdtemp(prefix="teai-bench-")
+    repeat = max(1, args.repeat)
+
+    app, gui_skipped = (None, "--no-gui") if args.no_gui else open_editor(workdir)
+    if app is not None:
+        app.model_var.set(MODEL)
+    else:
+        print(f"Editor stages skipped: {gui_skipped}", file=sys.stderr)
+
+    results = []
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for size in sizes:
+            text = synthetic_document(size, args.seed)
+            runs = []
+            for _ in range(repeat):
+                timings, info = run_pipeline(client, text, workdir, args.stream)
+                runs.append(timings)
+            result = {"size": size, "chars": len(text), **info, "pipeline": _median(runs)}
+            if app is not None:
+                result["editor"] = _median([run_editor(app, text, args.stream) for _ in range(repeat)])
+            if not args.no_memory:
+                result["peak_memory_bytes"] = peak_memory(client, text, workdir, args.stream)
+            results.append(result)
+            print(f"{size:>9} B: llm {result['pipeline']['llm']:.3f} s, diff {result['pipeline']['diff']:.3f} s, "
+                  f"bold {result['pipeline']['bold']:.3f} s"
+                  + (f", render {result['editor']['render']:.3f} s" if "editor" in result else ""),
+                  file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        if app is not None:
+            app.shutdown()
+            app.root.destroy()
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    if max_rss is not None and sys.platform != "darwin":
+        max_rss *= 1024
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fake_client": {"pattern": args.pattern, "rate": args.rate, "latency": args.latency,
+                        "tokens_per_second": args.tokens_per_second, "seed": args.seed},
+        "stream": args.stream,
+        "repeat": repeat,
+        "chunk_chars": teai_llm.CHUNK_CHARS,
+        "num_parallel": teai_llm.NUM_PARALLEL,
+        "editor": app is not None,
+        "editor_skipped": gui_skipped,
+        "max_rss_bytes": max_rss,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
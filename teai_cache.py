@@ -0,0 +1,157 @@
+"""
+Content-addressed cache for LLM responses.
+
+Entries are keyed on a hash of everything that influences the answer (model,
+system prompt, instruction, options, surrounding context and the text
+itself). Lookups go through a small in-memory LRU first, then a size-bounded
+SQLite file that survives restarts.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "TextEnhanceAI", "responses.sqlite3")
+
+
+def cache_key(model, system_prompt, instruction, options, text, context=None):
+    """Return a stable hex digest identifying one edit request."""
+    fields = [model, system_prompt, instruction, options or {}, text]
+    if context is not None:
+        fields.append(list(context))
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-level response cache: in-memory LRU in front of an on-disk SQLite store.
+
+    Safe to share between worker threads. Set path=None for a memory-only cache.
+    """
+    def __init__(self, path=DEFAULT_PATH, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+                self._db.commit()
+                row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+                self._disk_bytes = row[0]
+            except (OSError, sqlite3.Error) as e:
+                print(f"Response cache disabled on disk: {e}")
+                self._db = None
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                        value = row[0]
+                except sqlite3.Error:
+                    value = None
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        """Store value under key in memory and on disk."""
+        with self._lock:
+            self._remember(key, value)
+            if self._db is None:
+                return
+            size = len(value.encode("utf-8"))
+            if size > self.max_bytes:
+                return
+            try:
+                row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                self._disk_bytes += size - (row[0] if row else 0)
+                self._evict_disk()
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        """Return a dict of counters for display."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Drop least recently used rows until the store fits its budget
+        while self._disk_bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_bytes:
+                    break
+
+
+def cache_from_env():
+    """Build the cache configured by TEAI_CACHE* environment variables, or None."""
+    if os.getenv("TEAI_CACHE", "1") == "0":
+        return None
+    path = os.getenv("TEAI_CACHE_PATH", DEFAULT_PATH) or None
+    return ResponseCache(
+        path=path,
+        max_entries=int(os.getenv("TEAI_CACHE_ENTRIES", "256")),
+        max_bytes=int(float(os.getenv("TEAI_CACHE_MB", "64")) * 1024 * 1024),
+    )
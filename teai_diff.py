@@ -0,0 +1,407 @@
+"""
+Token diff engine for TextEnhanceAI.
+
+Texts are split into word and whitespace tokens (the same split the editor
+has always used), tokens are interned to integer IDs and compared with the
+Myers O(ND) algorithm. The result is a list of opcodes in the format of
+difflib.SequenceMatcher.get_opcodes(). When the edit distance exceeds a cost
+bound, the diff falls back to sentence units, then to paragraph units, so a
+complete rewrite stays cheap.
+"""
+import bisect
+import os
+import re
+from collections import namedtuple
+
+# Maximum edit distance explored by one Myers run before falling back to a
+# coarser granularity. Memory for the search grows with the square of it.
+MAX_COST = int(os.getenv("TEAI_DIFF_MAX_COST", "500"))
+
+_TOKEN_SPLIT = re.compile(r'(\s+)')
+_SENTENCE_END = re.compile(r'[.!?:;]["\')\]]*$')
+
+TOKEN, SENTENCE, PARAGRAPH = 0, 1, 2
+
+
+def tokenize(text):
+    """Split on whitespace while keeping the whitespace tokens."""
+    return _TOKEN_SPLIT.split(text)
+
+
+def _intern(a, b):
+    ids = {}
+    return ([ids.setdefault(t, len(ids)) for t in a],
+            [ids.setdefault(t, len(ids)) for t in b])
+
+
+def _myers(a, b, max_cost):
+    """
+    Return the edit script between sequences a and b as opcodes, or None if
+    more than max_cost insertions + deletions would be needed.
+    """
+    n, m = len(a), len(b)
+    limit = min(n + m, max_cost)
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+    for d in range(limit + 1):
+        # State after step d - 1, covering diagonals -d-1 .. d+1
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace, x, y):
+    steps = []  # (kind, x, y) in reverse order
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        base = d + 1  # index of diagonal 0 in this slice
+        k = x - y
+        if k == -d or (k != d and v[base + k - 1] < v[base + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[base + prev_k] if d > 0 else 0
+        prev_y = prev_x - prev_k if d > 0 else 0
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            steps.append(("equal", x, y))
+        if d > 0:
+            if x == prev_x:
+                steps.append(("insert", prev_x, prev_y))
+            else:
+                steps.append(("delete", prev_x, prev_y))
+        x, y = prev_x, prev_y
+    steps.reverse()
+
+    opcodes = []
+    i = j = 0
+    for kind, _, _ in steps:
+        ni, nj = (i + 1, j + 1) if kind == "equal" else (i + 1, j) if kind == "delete" else (i, j + 1)
+        tag = "equal" if kind == "equal" else "change"
+        if opcodes and opcodes[-1][0] == tag:
+            opcodes[-1][2] = ni
+            opcodes[-1][4] = nj
+        else:
+            opcodes.append([tag, i, ni, j, nj])
+        i, j = ni, nj
+    return [(_change_tag(op), op[1], op[2], op[3], op[4]) for op in opcodes]
+
+
+def _change_tag(op):
+    tag, i1, i2, j1, j2 = op
+    if tag == "equal":
+        return tag
+    if i1 == i2:
+        return "insert"
+    if j1 == j2:
+        return "delete"
+    return "replace"
+
+
+def _units(tokens, level):
+    """Group tokens into sentence or paragraph units; return their [start, end) spans."""
+    spans = []
+    start = 0
+    for i, tok in enumerate(tokens):
+        if i and tok.isspace():
+            # A line break always ends a sentence unit; paragraphs need a blank line
+            breaks = tok.count("\n")
+            end_unit = breaks >= 2 if level == PARAGRAPH else (
+                breaks >= 1 or bool(_SENTENCE_END.search(tokens[i - 1])))
+            if end_unit:
+                spans.append((start, i + 1))
+                start = i + 1
+    if start < len(tokens):
+        spans.append((start, len(tokens)))
+    return spans
+
+
+def _shift(opcodes, di, dj):
+    return [(tag, i1 + di, i2 + di, j1 + dj, j2 + dj) for tag, i1, i2, j1, j2 in opcodes]
+
+
+def _unique_anchors(a, b):
+    """
+    Return (i, j) pairs of items occurring exactly once in both a and b,
+    reduced to their longest increasing run (the anchors of patience diff).
+
+    Returns [] when most unique items moved around (text reordered or
+    rewritten): splitting on a handful of anchors would only recurse deeply.
+    """
+    counts = {}
+    for x in a:
+        counts[x] = counts.get(x, 0) + 1
+    pos_b = {}
+    for j, x in enumerate(b):
+        if counts.get(x) == 1:
+            pos_b[x] = -1 if x in pos_b else j
+    pairs = [(i, pos_b[x]) for i, x in enumerate(a) if pos_b.get(x, -1) >= 0]
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence on j (patience sorting)
+    tails, tail_idx, prev = [], [], [None] * len(pairs)
+    for n, (_, j) in enumerate(pairs):
+        k = bisect.bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_idx.append(n)
+        else:
+            tails[k] = j
+            tail_idx[k] = n
+        prev[n] = tail_idx[k - 1] if k else None
+    anchors = []
+    n = tail_idx[-1]
+    while n is not None:
+        anchors.append(pairs[n])
+        n = prev[n]
+    anchors.reverse()
+    if len(anchors) * 2 < len(pairs):
+        return []
+    return anchors
+
+
+def _diff_ids(a, b, max_cost):
+    """
+    Return opcodes for two sequences of interned IDs.
+
+    Large regions are first split on unique common items; each gap then goes
+    through a bounded Myers run. Gaps that need more than max_cost edits are
+    returned with the tag "unresolved" so the caller can retry them coarser.
+    """
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+
+    ops = [("equal", 0, prefix, 0, prefix)]
+    mid_a, mid_b = a[prefix:n - suffix], b[prefix:m - suffix]
+    if not mid_a or not mid_b:
+        ops.append((_change_tag(("change", prefix, n - suffix, prefix, m - suffix)),
+                    prefix, n - suffix, prefix, m - suffix))
+    else:
+        anchors = _unique_anchors(mid_a, mid_b) if len(mid_a) + len(mid_b) > max_cost else []
+        if anchors:
+            pi = pj = 0
+            for i, j in anchors + [(len(mid_a), len(mid_b))]:
+                ops.extend(_shift(_diff_ids(mid_a[pi:i], mid_b[pj:j], max_cost), prefix + pi, prefix + pj))
+                if i < len(mid_a):
+                    ops.append(("equal", prefix + i, prefix + i + 1, prefix + j, prefix + j + 1))
+                pi, pj = i + 1, j + 1
+        else:
+            mid = _myers(mid_a, mid_b, max_cost)
+            if mid is None:
+                mid = [("unresolved", 0, len(mid_a), 0, len(mid_b))]
+            ops.extend(_shift(mid, prefix, prefix))
+    ops.append(("equal", n - suffix, n, m - suffix, m))
+    return [op for op in ops if op[1] != op[2] or op[3] != op[4]]
+
+
+def _diff_region(a, b, ai, bj, max_cost, level):
+    """Diff token lists a and b, which start at ai / bj in the full sequences."""
+    if level == TOKEN:
+        a_spans = [(i, i + 1) for i in range(len(a))]
+        b_spans = [(j, j + 1) for j in range(len(b))]
+        unit_ops = _diff_ids(*_intern(a, b), max_cost)
+    else:
+        a_spans = _units(a, level)
+        b_spans = _units(b, level)
+        unit_ops = _diff_ids(*_intern(["".join(a[s:e]) for s, e in a_spans],
+                                      ["".join(b[s:e]) for s, e in b_spans]), max_cost)
+
+    out = []
+    for tag, u1, u2, w1, w2 in unit_ops:
+        i1 = a_spans[u1][0] if u1 < len(a_spans) else len(a)
+        i2 = a_spans[u2 - 1][1] if u2 > u1 else i1
+        j1 = b_spans[w1][0] if w1 < len(b_spans) else len(b)
+        j2 = b_spans[w2 - 1][1] if w2 > w1 else j1
+        if tag == "unresolved" and level < PARAGRAPH:
+            # Too many edits at this granularity: compare whole sentences/paragraphs
+            out.extend(_diff_region(a[i1:i2], b[j1:j2], ai + i1, bj + j1, max_cost, level + 1))
+            continue
+        if tag == "replace" and level > TOKEN:
+            # Refine changed sentences word by word when that stays within budget
+            ops = _myers(*_intern(a[i1:i2], b[j1:j2]), max_cost)
+            if ops is not None:
+                out.extend(_shift(ops, ai + i1, bj + j1))
+                continue
+        if tag == "unresolved":
+            tag = "replace"
+        out.append((tag, ai + i1, ai + i2, bj + j1, bj + j2))
+    return out
+
+
+def _merge(opcodes):
+    """Merge adjacent opcodes so that equal runs and change runs alternate."""
+    merged = []
+    for op in opcodes:
+        if op[1] == op[2] and op[3] == op[4]:
+            continue
+        if merged and (merged[-1][0] == "equal") == (op[0] == "equal"):
+            prev = merged[-1]
+            span = (prev[1], op[2], prev[3], op[4])
+            tag = "equal" if op[0] == "equal" else _change_tag(("change",) + span)
+            merged[-1] = (tag,) + span
+        else:
+            merged.append(op)
+    return merged
+
+
+def diff_tokens(a, b, max_cost=MAX_COST):
+    """
+    Return SequenceMatcher-style opcodes turning token list a into b.
+
+    Regions needing more than max_cost edits fall back to sentence units,
+    then paragraph units, and finally to a single replaced block.
+    """
+    return _merge(_diff_region(a, b, 0, 0, max_cost, TOKEN))
+
+
+def diff_texts(old_text, new_text, max_cost=MAX_COST):
+    """Tokenize both texts and diff them. Returns (old_tokens, new_tokens, opcodes)."""
+    old_tokens = tokenize(old_text)
+    new_tokens = tokenize(new_text)
+    return old_tokens, new_tokens, diff_tokens(old_tokens, new_tokens, max_cost)
+
+
+def iter_changes(old_tokens, new_tokens, opcodes):
+    """
+    Yield (marker, token) pairs like difflib.ndiff: '  ' unchanged, '- ' removed,
+    '+ ' added. Within a replaced run, removals come before additions.
+    """
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            for tok in old_tokens[i1:i2]:
+                yield "  ", tok
+            continue
+        for tok in old_tokens[i1:i2]:
+            yield "- ", tok
+        for tok in new_tokens[j1:j2]:
+            yield "+ ", tok
+
+
+Hunk = namedtuple("Hunk", [
+    "tag",          # "replace", "delete" or "insert"
+    "old_start",    # character offsets in the old text
+    "old_end",
+    "new_start",    # character offsets in the new text
+    "new_end",
+    "view_start",   # character offset in the rendered inline diff
+    "old_tokens",
+    "new_tokens",
+])
+
+
+class TextDiff:
+    """
+    The diff between two texts, computed once and shared by every consumer:
+    the inline renderer, the Markdown scratchpad formatter and Accept/Reject.
+
+    hunks holds the changed regions in order; view_starts is their sorted
+    offsets in the rendered view (equal text, then removed, then added).
+    """
+    def __init__(self, old_text, new_text, max_cost=MAX_COST):
+        self.old_text = old_text
+        self.new_text = new_text
+        self.old_tokens, self.new_tokens, self.opcodes = diff_texts(old_text, new_text, max_cost)
+
+        self.hunks = []
+        old_pos = new_pos = view_pos = 0
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            old_len = sum(len(t) for t in self.old_tokens[i1:i2])
+            new_len = sum(len(t) for t in self.new_tokens[j1:j2])
+            if tag == "equal":
+                view_pos += old_len
+            else:
+                self.hunks.append(Hunk(tag, old_pos, old_pos + old_len, new_pos, new_pos + new_len,
+                                       view_pos, self.old_tokens[i1:i2], self.new_tokens[j1:j2]))
+                view_pos += old_len + new_len
+            old_pos += old_len
+            new_pos += new_len
+        self.view_starts = [h.view_start for h in self.hunks]
+
+    def segments(self):
+        """Yield (tag, text) runs for rendering: tag is None, "deletion" or "addition"."""
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag == "equal":
+                yield None, "".join(self.old_tokens[i1:i2])
+                continue
+            if i2 > i1:
+                yield "deletion", "".join(self.old_tokens[i1:i2])
+            if j2 > j1:
+                yield "addition", "".join(self.new_tokens[j1:j2])
+
+    def changes(self):
+        """Yield ndiff-style (marker, token) pairs."""
+        return iter_changes(self.old_tokens, self.new_tokens, self.opcodes)
+
+    def apply(self, accepted):
+        """
+        Return the text with the hunks whose indices are in accepted applied
+        and every other hunk reverted. Cost grows with the number of hunks.
+        """
+        out = []
+        pos = 0
+        for n, h in enumerate(self.hunks):
+            out.append(self.old_text[pos:h.old_start])
+            out.append("".join(h.new_tokens) if n in accepted else self.old_text[h.old_start:h.old_end])
+            pos = h.old_end
+        out.append(self.old_text[pos:])
+        return "".join(out)
+
+    def next_hunk(self, view_offset):
+        """Index of the first hunk starting after view_offset, or None."""
+        n = bisect.bisect_right(self.view_starts, view_offset)
+        return n if n < len(self.hunks) else None
+
+    def as_dict(self):
+        """JSON-friendly description of the hunks (offsets and changed text)."""
+        return {
+            "changes": len(self.hunks),
+            "hunks": [
+                {
+                    "tag": h.tag,
+                    "old_start": h.old_start,
+                    "old_end": h.old_end,
+                    "new_start": h.new_start,
+                    "new_end": h.new_end,
+                    "old_text": "".join(h.old_tokens),
+                    "new_text": "".join(h.new_tokens),
+                }
+                for h in self.hunks
+            ],
+        }
+
+    def bold_markdown(self):
+        """
+        Return (old, new) Markdown strings with removed words in bold in the
+        old text and added words in bold in the new text. Whitespace is left
+        unbolded so the original line breaks survive.
+        """
+        old_out = []
+        new_out = []
+        for marker, text in self.changes():
+            if marker == "  ":
+                old_out.append(text)
+                new_out.append(text)
+            elif marker == "- ":
+                old_out.append(text if text.isspace() or text == "" else f"**{text}**")
+            else:
+                new_out.append(text if text.isspace() or text == "" else f"**{text}**")
+        return "".join(old_out), "".join(new_out)
@@ -0,0 +1,169 @@
+"""
+Deterministic stand-in for the ollama Client, for benchmarks and offline runs.
+
+FakeClient answers chat(), list(), ps() and show() like a local Ollama server
+would, including streamed chunks, the token counters of the final chunk and
+answers cut off at num_predict (done_reason "length"), but
+edits the text with a simple seeded pattern instead of a model. The same
+input always produces the same output. Latency before the first token and
+the token rate can be set to mimic a real model.
+"""
+import random
+import re
+import threading
+import time
+
+# Edit patterns: how the fake "model" changes each word
+PATTERNS = ("identity", "typos", "rewrite", "upper")
+
+# Words used by the "rewrite" pattern and by synthetic documents
+WORDS = (
+    "the", "a", "model", "text", "editor", "change", "quick", "local", "draft", "review",
+    "sentence", "paragraph", "clear", "simple", "however", "because", "result", "small",
+    "large", "update", "writer", "reader", "should", "would", "often", "never", "always",
+    "word", "line", "page", "note", "idea", "point", "fact", "case", "time", "work",
+)
+
+_TOKEN = re.compile(r'\S+\s*|\s+')
+_TEXT_MARKER = "\n\nText:\n"
+
+
+def _user_text(messages):
+    """The text to edit from a build_messages() history."""
+    content = messages[-1]["content"] if messages else ""
+    return content.split(_TEXT_MARKER, 1)[1] if _TEXT_MARKER in content else content
+
+
+def _mutate(word, rng):
+    if len(word) > 3:
+        i = rng.randrange(1, len(word) - 2)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word + "s"
+
+
+def apply_pattern(text, pattern="typos", rate=0.05, seed=0):
+    """Return text edited by pattern; about rate of the words are changed."""
+    if pattern == "identity":
+        return text
+    if pattern == "upper":
+        return text.upper()
+    rng = random.Random(f"{seed}:{pattern}:{rate}:{text}")
+    out = []
+    for token in _TOKEN.findall(text):
+        word = token.rstrip()
+        if not word or rng.random() >= rate:
+            out.append(token)
+            continue
+        space = token[len(word):]
+        if pattern == "typos":
+            out.append(_mutate(word, rng) + space)
+        else:
+            roll = rng.random()
+            if roll < 0.2:
+                continue  # drop the word
+            if roll < 0.4:
+                out.append(word + " " + rng.choice(WORDS) + space)
+            else:
+                out.append(rng.choice(WORDS) + space)
+    return "".join(out)
+
+
+def synthetic_document(size, seed=0):
+    """Deterministic prose of about size characters, in paragraphs."""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(5, 18))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:size].rstrip()
+
+
+class FakeClient:
+    """
+    Drop-in for ollama.Client: chat(), list(), ps() and show().
+
+    latency: seconds before the first token. tokens_per_second: generation
+    speed (0 = instant). pattern/rate/seed: see apply_pattern().
+    context_length: reported by show(), where teai_planner looks it up.
+    """
+    def __init__(self, latency=0.0, tokens_per_second=0.0, pattern="typos", rate=0.05, seed=0,
+                 models=("fake:latest",), context_length=32768):
+        if pattern not in PATTERNS:
+            raise ValueError(f"unknown pattern {pattern!r}; expected one of {', '.join(PATTERNS)}")
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.pattern = pattern
+        self.rate = rate
+        self.seed = seed
+        self.models = list(models)
+        self.context_length = context_length
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def list(self):
+        return {"models": [{"name": m, "model": m} for m in self.models]}
+
+    def ps(self):
+        return {"models": [{"name": m, "model": m} for m in self.models]}
+
+    def show(self, model):
+        return {"modelinfo": {"general.architecture": "fake", "fake.context_length": self.context_length}}
+
+    def chat(self, model=None, messages=None, options=None, stream=False, keep_alive=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if not messages:
+            # An empty chat only loads the model
+            return {"model": model, "message": {"role": "assistant", "content": ""},
+                    "done": True, "done_reason": "load"}
+        text = _user_text(messages)
+        output = apply_pattern(text, self.pattern, self.rate, self.seed).strip()
+        tokens = _TOKEN.findall(output)
+        prompt_tokens = sum(len(_TOKEN.findall(m.get("content", ""))) for m in messages)
+        reason = "stop"
+        limit = (options or {}).get("num_predict")
+        if limit is not None and 0 <= limit < len(tokens):
+            tokens = tokens[:limit]
+            output = "".join(tokens)
+            reason = "length"
+        if stream:
+            return self._stream(model, tokens, prompt_tokens, reason)
+        start = time.perf_counter()
+        self._wait(start, len(tokens))
+        return self._final(model, output, len(tokens), prompt_tokens, time.perf_counter() - start, reason)
+
+    def _wait(self, start, produced):
+        """Sleep until produced tokens are due."""
+        due = self.latency + (produced / self.tokens_per_second if self.tokens_per_second else 0.0)
+        delay = start + due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _stream(self, model, tokens, prompt_tokens, reason):
+        start = time.perf_counter()
+        for n, token in enumerate(tokens, 1):
+            # Sleep in small batches rather than per token to keep the stub cheap
+            if n == 1 or n % 16 == 0:
+                self._wait(start, n)
+            yield {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+        self._wait(start, len(tokens))
+        yield self._final(model, "", len(tokens), prompt_tokens, time.perf_counter() - start, reason)
+
+    def _final(self, model, content, eval_count, prompt_tokens, seconds, reason="stop"):
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": reason,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": 0,
+            "eval_count": eval_count,
+            "eval_duration": int(seconds * 1e9),
+            "load_duration": 0,
+        }
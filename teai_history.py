@@ -0,0 +1,166 @@
+"""
+In-memory revision history for TextEnhanceAI with undo and redo.
+
+Each revision is stored as a delta against the previous one: the changed
+regions found by teai_diff, with their offsets and their old and new text.
+Undo and redo apply one delta to the current text, so their cost follows the
+size of the change rather than of the document. A full snapshot is also kept
+every TEAI_HISTORY_SNAPSHOT_EVERY revisions so any revision can be rebuilt
+without replaying the whole session, and the oldest revisions are dropped
+once the history holds more than TEAI_HISTORY_MB.
+"""
+import os
+import time
+from collections import namedtuple
+
+from teai_diff import diff_texts
+
+SNAPSHOT_EVERY = int(os.getenv("TEAI_HISTORY_SNAPSHOT_EVERY", "20"))
+MAX_BYTES = int(float(os.getenv("TEAI_HISTORY_MB", "32")) * 1024 * 1024)
+
+# One changed region: offsets in the old and new text, then the text replaced
+# and the text replacing it
+Change = namedtuple("Change", ["old_start", "new_start", "old_text", "new_text"])
+
+Revision = namedtuple("Revision", [
+    "label",
+    "time",
+    "delta",     # tuple of Change from the previous revision (empty for the first)
+    "snapshot",  # the full text, or None
+    "size",      # characters held by delta and snapshot
+])
+
+
+def text_delta(old_text, new_text):
+    """Return the tuple of Change turning old_text into new_text."""
+    old_tokens, new_tokens, opcodes = diff_texts(old_text, new_text)
+    changes = []
+    old_pos = new_pos = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        old_chunk = "".join(old_tokens[i1:i2])
+        new_chunk = "".join(new_tokens[j1:j2])
+        if tag != "equal":
+            changes.append(Change(old_pos, new_pos, old_chunk, new_chunk))
+        old_pos += len(old_chunk)
+        new_pos += len(new_chunk)
+    return tuple(changes)
+
+
+def delta_edits(delta, reverse=False):
+    """
+    Return [(start, end, replacement)] replacing regions of the old text (or
+    of the new text with reverse=True), in order of start.
+    """
+    if reverse:
+        return [(c.new_start, c.new_start + len(c.new_text), c.old_text) for c in delta]
+    return [(c.old_start, c.old_start + len(c.old_text), c.new_text) for c in delta]
+
+
+def apply_edits(text, edits):
+    """Apply ordered, non-overlapping (start, end, replacement) edits to text."""
+    out = []
+    pos = 0
+    for start, end, replacement in edits:
+        out.append(text[pos:start])
+        out.append(replacement)
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+class History:
+    """
+    Linear undo/redo history of whole-text revisions.
+
+    index points at the revision the editor currently shows. Recording a new
+    revision after some undos drops the revisions that could have been redone.
+    """
+    def __init__(self, text="", snapshot_every=SNAPSHOT_EVERY, max_bytes=MAX_BYTES):
+        self.snapshot_every = max(1, snapshot_every)
+        self.max_bytes = max_bytes
+        self.reset(text)
+
+    def reset(self, text=""):
+        self.text = text
+        self.index = 0
+        self._revisions = [Revision("Start", time.time(), (), text, len(text))]
+        self._size = len(text)
+
+    def __len__(self):
+        return len(self._revisions)
+
+    @property
+    def size(self):
+        """Characters held by deltas and snapshots (the current text aside)."""
+        return self._size
+
+    def can_undo(self):
+        return self.index > 0
+
+    def can_redo(self):
+        return self.index < len(self._revisions) - 1
+
+    def label(self, index=None):
+        return self._revisions[self.index if index is None else index].label
+
+    def record(self, text, label):
+        """Add text as the newest revision. Returns False if it is unchanged."""
+        if text == self.text:
+            return False
+        delta = text_delta(self.text, text)
+        for dropped in self._revisions[self.index + 1:]:
+            self._size -= dropped.size
+        del self._revisions[self.index + 1:]
+        since_snapshot = next(n for n, rev in enumerate(reversed(self._revisions)) if rev.snapshot is not None)
+        snapshot = text if since_snapshot + 1 >= self.snapshot_every else None
+        size = sum(len(c.old_text) + len(c.new_text) for c in delta) + (len(text) if snapshot else 0)
+        self._revisions.append(Revision(label, time.time(), delta, snapshot, size))
+        self._size += size
+        self.index = len(self._revisions) - 1
+        self.text = text
+        self._trim()
+        return True
+
+    def undo(self):
+        """
+        Step back one revision. Returns (text, edits) where edits turn the
+        previous current text into text (see apply_edits), or None.
+        """
+        if not self.can_undo():
+            return None
+        edits = delta_edits(self._revisions[self.index].delta, reverse=True)
+        self.text = apply_edits(self.text, edits)
+        self.index -= 1
+        return self.text, edits
+
+    def redo(self):
+        """Step forward one revision; same return value as undo."""
+        if not self.can_redo():
+            return None
+        self.index += 1
+        edits = delta_edits(self._revisions[self.index].delta)
+        self.text = apply_edits(self.text, edits)
+        return self.text, edits
+
+    def text_at(self, index):
+        """Rebuild revision index from the nearest snapshot at or before it."""
+        if index == self.index:
+            return self.text
+        base = index
+        while self._revisions[base].snapshot is None:
+            base -= 1
+        text = self._revisions[base].snapshot
+        for rev in self._revisions[base + 1:index + 1]:
+            text = apply_edits(text, delta_edits(rev.delta))
+        return text
+
+    def _trim(self):
+        # Drop the oldest revisions a snapshot at a time, keeping the current one
+        while self._size > self.max_bytes and self.index > 0:
+            cut = next((n for n in range(1, self.index + 1) if self._revisions[n].snapshot is not None), 1)
+            # The new first revision only needs its snapshot
+            text = self.text_at(cut)
+            del self._revisions[:cut]
+            self.index -= cut
+            self._revisions[0] = self._revisions[0]._replace(delta=(), snapshot=text, size=len(text))
+            self._size = sum(rev.size for rev in self._revisions)
@@ -0,0 +1,48 @@
+"""
+Dirty-paragraph tracking for incremental re-edits in TextEnhanceAI.
+
+After an action's result is accepted, the hashes of the accepted text's
+paragraphs are remembered. When the same action runs again on the same
+model, only paragraphs whose hash is new are sent to the model (see
+teai_llm.edit_document's clean argument).
+"""
+import hashlib
+
+from teai_llm import split_paragraphs
+
+
+def paragraph_hash(paragraph):
+    """Hash of a paragraph, ignoring surrounding whitespace."""
+    return hashlib.sha1(paragraph.strip().encode("utf-8")).hexdigest()
+
+
+class ParagraphTracker:
+    """Paragraph hashes of the text the last accepted action settled on."""
+    def __init__(self):
+        self.key = None
+        self._hashes = frozenset()
+
+    def mark_clean(self, text, key):
+        """Remember text as the result of the action identified by key."""
+        self.key = key
+        self._hashes = frozenset(paragraph_hash(para) for para, _ in split_paragraphs(text))
+
+    def reset(self):
+        self.key = None
+        self._hashes = frozenset()
+
+    def dirty(self, text, key):
+        """
+        Return (clean, dirty count, paragraph count) for re-running the
+        action key on text. clean is a predicate for edit_document, or None
+        when the whole text should be sent: a different action, nothing
+        remembered, or no paragraph (or every paragraph) changed.
+        """
+        paragraphs = [para for para, _ in split_paragraphs(text) if para.strip()]
+        if key != self.key or not self._hashes:
+            return None, len(paragraphs), len(paragraphs)
+        hashes = self._hashes
+        dirty = sum(1 for para in paragraphs if paragraph_hash(para) not in hashes)
+        if dirty in (0, len(paragraphs)):
+            return None, len(paragraphs), len(paragraphs)
+        return (lambda para: paragraph_hash(para) in hashes), dirty, len(paragraphs)
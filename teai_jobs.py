@@ -0,0 +1,135 @@
+"""
+Job scheduler for TextEnhanceAI.
+
+Jobs run one at a time on a worker thread, in submission order. Each job
+carries a cancel event that the LLM pipeline polls, so the running request
+can be aborted and queued ones dropped. Submitting a job identical to the
+one queued last (or running, if none is queued) is ignored.
+"""
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from teai_llm import Cancelled
+
+
+class Job:
+    """
+    One unit of work.
+
+    prepare() runs on the UI thread (through the scheduler's dispatch) right
+    before the job starts and returns its input, or None to skip the job.
+    run(job, prepared) runs on the worker thread and returns the result.
+    on_done(result), on_error(exc) and on_cancel() are dispatched to the UI thread.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, key, run, prepare=None, on_done=None, on_error=None, on_cancel=None):
+        self.id = next(Job._ids)
+        self.key = key
+        self.run = run
+        self.prepare = prepare
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+
+class JobScheduler:
+    """
+    Serial job queue. dispatch(fn) must call fn on the UI thread (for Tk:
+    lambda fn: root.after(0, fn)); without it callbacks run on the worker.
+    """
+    def __init__(self, dispatch=None):
+        self._dispatch = dispatch or (lambda fn: fn())
+        self._queue = deque()
+        self._current = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, run, prepare=None, on_done=None, on_error=None, on_cancel=None):
+        """Queue a job and return it, or return None if it duplicates the last one."""
+        with self._cond:
+            last = self._queue[-1] if self._queue else self._current
+            if key is not None and last is not None and last.key == key and not last.cancelled:
+                return None
+            job = Job(key, run, prepare, on_done, on_error, on_cancel)
+            self._queue.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="teai-jobs", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return job
+
+    def cancel_all(self):
+        """Cancel the running job and drop every queued one."""
+        with self._cond:
+            dropped = list(self._queue)
+            self._queue.clear()
+            if self._current is not None:
+                self._current.cancel()
+        for job in dropped:
+            job.cancel()
+            if job.on_cancel:
+                self._dispatch(job.on_cancel)
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self._cond:
+            return len(self._queue) + (self._current is not None)
+
+    @property
+    def current(self):
+        with self._cond:
+            return self._current
+
+    def _call_on_ui(self, fn):
+        # Run fn through dispatch and wait for its return value
+        future = Future()
+
+        def call():
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+
+        self._dispatch(call)
+        return future.result()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._current = self._queue.popleft()
+
+            callback = None
+            try:
+                prepared = self._call_on_ui(job.prepare) if job.prepare else None
+                if job.prepare and prepared is None:
+                    job.cancel()
+                if job.cancelled:
+                    raise Cancelled()
+                result = job.run(job, prepared)
+                if job.cancelled:
+                    raise Cancelled()
+                if job.on_done:
+                    callback = lambda job=job, result=result: job.on_done(result)
+            except Cancelled:
+                callback = job.on_cancel
+            except Exception as e:
+                if job.on_error:
+                    callback = lambda job=job, e=e: job.on_error(e)
+
+            with self._cond:
+                self._current = None
+            if callback:
+                self._dispatch(callback)
@@ -0,0 +1,533 @@
+"""
+LLM helpers for TextEnhanceAI: prompt construction, Ollama chat calls and
+the chunked document pipeline.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import teai_planner
+from teai_cache import cache_key
+
+# --------------
+# Configurable prompts for each action
+# --------------
+PROMPTS = {
+    "Grammar": "Fix grammar issues without altering the meaning.",
+    "Proofread": "Proofread the text comprehensively, correcting errors and improving readability.",
+    "Natural": "Refine awkward phrasing to make the text feel natural while preserving the original meaning.",
+    "Streamline": "Remove unnecessary elements, clarify the message, and ensure coherence and ease of understanding.",
+    "Awkward": "Fix only awkward or poorly written sentences without making other changes.",
+    "Rewrite": "Rewrite the text to improve clarity, flow, and overall readability.",
+    "Concise": "Make the text more concise by removing redundancy and unnecessary content.",
+    "Polish": "Refine awkward words or phrases to give the text a polished and professional tone.",
+    "Improve": "Enhance the text by proofreading and improving its clarity, flow, and coherence.",
+}
+
+SYSTEM_PROMPT = (
+    "You are a helpful, concise assistant that carefully edits text "
+    "based on instructions. Return only the edited text, without extra commentary."
+)
+
+DEFAULT_OPTIONS = {
+    'num_predict': 2048,
+    'temperature': 0.7,
+    'top_p': 0.9,
+}
+
+# Largest chunk (in characters) sent to the model in a single request
+CHUNK_CHARS = int(os.getenv("TEAI_CHUNK_CHARS", "4000"))
+# Number of chunks in flight at once; keep it in line with OLLAMA_NUM_PARALLEL
+NUM_PARALLEL = max(1, int(os.getenv("TEAI_NUM_PARALLEL", os.getenv("OLLAMA_NUM_PARALLEL", "4"))))
+
+
+def _keep_alive(value):
+    """TEAI_KEEP_ALIVE as Ollama expects it: seconds as a number, or a duration such as "30m"."""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value) if "." in value else int(value)
+    except ValueError:
+        return value
+
+
+# How long Ollama keeps a model loaded after a request (None = server default)
+KEEP_ALIVE = _keep_alive(os.getenv("TEAI_KEEP_ALIVE", "30m"))
+
+# Surrounding text (in characters, each side) sent with a re-edited paragraph
+CONTEXT_CHARS = int(os.getenv("TEAI_CONTEXT_CHARS", "600"))
+
+# One or more blank lines (possibly holding spaces/tabs) separate paragraphs
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+# Where an over-long paragraph may be broken: after a sentence, else at a space
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|(?<=[\u3002\uff01\uff1f])\s*')
+_SPACE = re.compile(r'\s+')
+
+
+class Cancelled(Exception):
+    """Raised when a request is abandoned through its cancel event."""
+
+
+def translate_instruction(language):
+    """Instruction used by the Translate action."""
+    return f"Translate the text into {language}. Return only the translated text."
+
+
+def build_messages(instruction, text, system_prompt=SYSTEM_PROMPT, context=None):
+    """
+    Return the chat history for one edit request. context is an optional
+    (before, after) pair of surrounding text the model sees but must not return.
+    """
+    content = f"Instruction:\n{instruction}\n\n"
+    before, after = context or ("", "")
+    if before:
+        content += f"Preceding text (for context only, do not return it):\n{before}\n\n"
+    if after:
+        content += f"Following text (for context only, do not return it):\n{after}\n\n"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"{content}Text:\n{text}"}
+    ]
+
+
+def chunk_content(chunk):
+    """Return the text carried by one streamed chat chunk (dict or ChatResponse)."""
+    try:
+        message = chunk["message"]
+        content = message["content"]
+    except Exception:
+        message = getattr(chunk, "message", None)
+        content = getattr(message, "content", None)
+    return content or ""
+
+
+def done_reason(response):
+    """Why Ollama stopped generating ("stop", "length", ...), or None."""
+    try:
+        return response["done_reason"]
+    except Exception:
+        return getattr(response, "done_reason", None)
+
+
+def chat_edit(client, model, instruction, text, options=None, stream=False, on_text=None,
+              cache=None, cancel=None, metrics=None, context=None):
+    """
+    Send one edit request and return the edited text (stripped).
+
+    When stream is true, on_text(parts) is called after every received piece
+    with the list of pieces so far; the caller decides when to join them.
+    With a ResponseCache, an identical earlier request is answered from the
+    cache without contacting the model. Setting the cancel event (a
+    threading.Event) closes a running stream and raises Cancelled. A
+    teai_metrics.RequestMetrics passed as metrics receives the first-token
+    time and Ollama's token counters. context: see build_messages().
+
+    Without options, num_predict and num_ctx are sized to the request
+    (teai_planner). An answer cut off at num_predict (done_reason "length")
+    is then requested again with more room for output; once the context
+    window is full, or with fixed options, the text is split in two and each
+    half edited on its own. An answer still cut off after that is returned as
+    it is, counted by metrics.cut_off() and never cached.
+    """
+    return _chat_edit(client, model, instruction, text, options, stream, on_text,
+                      cache, cancel, metrics, context)[0]
+
+
+def _chat_edit(client, model, instruction, text, options, stream, on_text, cache, cancel, metrics,
+               context):
+    """chat_edit() returning (edited text, whether any part of it was cut off)."""
+    messages = build_messages(instruction, text, context=context)
+    planned = options is None and teai_planner.ENABLED
+    options = dict(DEFAULT_OPTIONS if options is None else options)
+    if planned:
+        options.update(teai_planner.plan_options(client, model, messages, text))
+    key = None
+    if cache is not None:
+        key = cache_key(model, SYSTEM_PROMPT, instruction, options, text, context)
+        cached = cache.get(key)
+        if cached is not None:
+            if metrics is not None:
+                metrics.cache_hit()
+            return cached, False
+    cut_off = False
+    while True:
+        if metrics is not None:
+            metrics.sized(options)
+        edited_text, reason = _chat(client, model, messages, options, stream, on_text, cancel, metrics)
+        if reason != "length":
+            break
+        if metrics is not None:
+            metrics.truncation()
+        # Fixed options (given, or TEAI_PLAN=0) are kept; only the split below applies
+        grown = teai_planner.grow_options(client, model, messages, options) if planned else None
+        if grown is not None:
+            options = grown
+            continue
+        halves = split_in_two(text)
+        if halves is None:
+            cut_off = True
+            if metrics is not None:
+                metrics.cut_off()
+            break
+        (first, sep), (second, _) = halves
+        retry_options = None if planned else options
+        first, first_cut = _chat_edit(client, model, instruction, first, retry_options, stream, on_text,
+                                      cache, cancel, metrics, context)
+        second, second_cut = _chat_edit(client, model, instruction, second, retry_options, stream,
+                                        (lambda parts: on_text([first, sep] + parts)) if on_text else None,
+                                        cache, cancel, metrics, context)
+        edited_text = first + sep + second
+        cut_off = first_cut or second_cut
+        break
+    if not edited_text:
+        raise RuntimeError("No content received from LLM.")
+    # An incomplete answer must not be served again on later runs
+    if key is not None and not cut_off:
+        cache.put(key, edited_text)
+    return edited_text, cut_off
+
+
+def _chat(client, model, messages, options, stream, on_text, cancel, metrics):
+    """One chat call for chat_edit; returns (stripped text, done_reason)."""
+    extra = {"keep_alive": KEEP_ALIVE} if KEEP_ALIVE is not None else {}
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    if stream:
+        parts = []
+        reason = None
+        chunks = client.chat(model=model, messages=messages, options=options, stream=True, **extra)
+        try:
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+                piece = chunk_content(chunk)
+                reason = done_reason(chunk) or reason
+                if metrics is not None:
+                    if piece:
+                        metrics.token()
+                    metrics.response(chunk)
+                if piece:
+                    parts.append(piece)
+                    if on_text:
+                        on_text(parts)
+        finally:
+            # Closing the generator ends the HTTP stream, so Ollama stops generating
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+        return "".join(parts).strip(), reason
+    response = client.chat(model=model, messages=messages, options=options, **extra)
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    if metrics is not None:
+        metrics.token()
+        metrics.response(response)
+    return chunk_content(response).strip(), done_reason(response)
+
+
+def split_paragraphs(text):
+    """
+    Split text at blank lines into (paragraph, separator) pairs; joining
+    every paragraph with its separator gives back the original text.
+    """
+    paragraphs = []
+    pos = 0
+    for m in _PARAGRAPH_BREAK.finditer(text):
+        paragraphs.append((text[pos:m.start()], m.group()))
+        pos = m.end()
+    paragraphs.append((text[pos:], ""))
+    return paragraphs
+
+
+def split_long(paragraphs, max_chars):
+    """
+    Break (paragraph, separator) pairs longer than max_chars into pieces at
+    sentence ends, or at spaces when a sentence alone is too long; the pieces
+    keep the whitespace between them as their separator.
+    """
+    out = []
+    for para, sep in paragraphs:
+        while len(para) > max_chars:
+            cut = None
+            for pattern in (_SENTENCE_BREAK, _SPACE):
+                breaks = list(pattern.finditer(para, 1, max_chars))
+                if breaks:
+                    cut = breaks[-1]
+                    break
+            if cut is None:
+                out.append((para[:max_chars], ""))
+                para = para[max_chars:]
+            else:
+                out.append((para[:cut.start()], cut.group()))
+                para = para[cut.end():]
+        out.append((para, sep))
+    return out
+
+
+def split_in_two(text):
+    """
+    Split text into [(first, separator), (second, "")] at the paragraph
+    break, sentence end or space nearest its middle, or return None.
+    """
+    middle = len(text) // 2
+    for pattern in (_PARAGRAPH_BREAK, _SENTENCE_BREAK, _SPACE):
+        breaks = [m for m in pattern.finditer(text) if 0 < m.start() and m.end() < len(text)]
+        if breaks:
+            m = min(breaks, key=lambda m: abs(m.start() - middle))
+            return [(text[:m.start()], m.group()), (text[m.end():], "")]
+    return None
+
+
+def split_into_chunks(text, max_chars=CHUNK_CHARS, paragraphs=None):
+    """
+    Split text at blank-line boundaries into chunks of at most max_chars.
+
+    Returns a list of (chunk, separator) pairs where separator is the
+    whitespace that followed the chunk, so that joining every chunk with its
+    separator gives back the original text. A single paragraph longer than
+    max_chars is kept whole. Pass paragraphs (from split_paragraphs) to
+    chunk only those.
+    """
+    if paragraphs is None:
+        paragraphs = split_paragraphs(text)
+
+    chunks = []
+    current, current_sep = "", ""
+    for para, sep in paragraphs:
+        if current and len(current) + len(current_sep) + len(para) > max_chars:
+            chunks.append((current, current_sep))
+            current, current_sep = para, sep
+        else:
+            current = current + current_sep + para if current else para
+            current_sep = sep
+    if current or not chunks:
+        chunks.append((current, current_sep))
+    return chunks
+
+
+def plan_chunks(text, max_chars=CHUNK_CHARS, clean=None, context_chars=CONTEXT_CHARS, hard_chars=None):
+    """
+    Return the requests for editing text as (chunk, separator, send, context)
+    tuples, in order.
+
+    Without clean, every chunk of split_into_chunks() is sent without
+    context. With clean(paragraph) -> bool, each run of clean paragraphs
+    becomes one chunk that is kept as is (send is False), and runs of other
+    paragraphs are chunked and sent with up to context_chars of the
+    surrounding text on each side as a (before, after) pair. Paragraphs sent
+    to the model are broken up when longer than hard_chars (see split_long).
+    """
+    if clean is None:
+        paragraphs = split_paragraphs(text)
+        if hard_chars:
+            paragraphs = split_long(paragraphs, hard_chars)
+        return [(chunk, sep, True, None) for chunk, sep in split_into_chunks(None, max_chars, paragraphs)]
+    paragraphs = split_paragraphs(text)
+    flags = [bool(clean(para)) for para, _ in paragraphs]
+    plan = []
+    pos = 0
+    i = 0
+    while i < len(paragraphs):
+        j = i
+        while j < len(paragraphs) and flags[j] == flags[i]:
+            j += 1
+        run = paragraphs[i:j]
+        if flags[i]:
+            chunk = "".join(para + sep for para, sep in run[:-1]) + run[-1][0]
+            sep = run[-1][1]
+            plan.append((chunk, sep, False, None))
+            pos += len(chunk) + len(sep)
+        else:
+            if hard_chars:
+                run = split_long(run, hard_chars)
+            for chunk, sep in split_into_chunks(None, max_chars, paragraphs=run):
+                end = pos + len(chunk)
+                context = (text[max(0, pos - context_chars):pos].strip(), text[end:end + context_chars].strip())
+                plan.append((chunk, sep, True, context))
+                pos = end + len(sep)
+        i = j
+    return plan
+
+
+def fit_chars(client, model, instructions, text, options=None, context_chars=0):
+    """
+    Longest chunk of text (in characters) whose request, with any of
+    instructions and context_chars of context on each side, fits the model's
+    context window; None when options are fixed or planning is off.
+    """
+    if options is not None or not teai_planner.ENABLED:
+        return None
+    overhead = max(teai_planner.estimate_tokens(SYSTEM_PROMPT + instruction) for instruction in instructions)
+    if context_chars:
+        overhead += 2 * teai_planner.estimate_tokens(text[:context_chars])
+    # The labels build_messages() puts around instruction, context and text
+    overhead += 48
+    return teai_planner.max_text_chars(client, model, overhead, text)
+
+
+def edit_document(client, model, instruction, text, options=None, stream=False,
+                  on_progress=None, max_workers=NUM_PARALLEL, max_chars=CHUNK_CHARS,
+                  cache=None, cancel=None, metrics=None, clean=None, context_chars=CONTEXT_CHARS):
+    """
+    Edit a whole document chunk by chunk through a bounded worker pool.
+
+    Chunks are sent concurrently (at most max_workers at a time) and the
+    results are reassembled in the original order with the original
+    paragraph separators. on_progress(snapshot) is called from worker threads
+    whenever output advances; snapshot() returns the in-order partial result
+    (finished chunks followed by the stream of the first unfinished one) and
+    is cheap to pass around, so callers can throttle the actual join.
+
+    The cache is consulted per chunk, so unchanged chunks of a partially
+    edited document come back without a model round-trip. Setting cancel
+    aborts the running chunks and skips the queued ones (raises Cancelled).
+    metrics is shared by all chunk requests (see chat_edit).
+
+    With clean(paragraph) -> bool, only the paragraphs it rejects are sent,
+    together with some surrounding text for context; the rest of the
+    document is returned unchanged (see plan_chunks).
+    """
+    return edit_pipeline(client, model, [instruction], text, options, stream, on_progress,
+                         max_workers, max_chars, cache, cancel, metrics, clean, context_chars)[-1]
+
+
+def edit_pipeline(client, model, instructions, text, options=None, stream=False,
+                  on_progress=None, max_workers=NUM_PARALLEL, max_chars=CHUNK_CHARS,
+                  cache=None, cancel=None, metrics=None, clean=None, context_chars=CONTEXT_CHARS):
+    """
+    Run several instructions in sequence over a document and return the
+    whole text after each stage, as a list (the last item is the result).
+
+    Each chunk goes through all stages on one worker, so one chunk can be in
+    a later stage while the next is still in an earlier one. Only the last
+    stage is streamed and reported through on_progress. Arguments otherwise
+    work as in edit_document().
+    """
+    hard_chars = fit_chars(client, model, instructions, text, options, context_chars if clean else 0)
+    if hard_chars:
+        max_chars = min(max_chars, hard_chars)
+    plan = plan_chunks(text, max_chars, clean, context_chars, hard_chars)
+    chunks = [(chunk, sep) for chunk, sep, _, _ in plan]
+    n = len(chunks)
+    stages = len(instructions)
+    # results[k][i]: chunk i after stage k
+    results = [[None] * n for _ in range(stages)]
+    partials = [[] for _ in range(n)]
+    lock = threading.Lock()
+
+    def snapshot():
+        out = []
+        with lock:
+            for i, (_, sep) in enumerate(chunks):
+                if results[-1][i] is None:
+                    out.append("".join(partials[i]))
+                    break
+                out.append(results[-1][i])
+                out.append(sep)
+        return "".join(out).strip()
+
+    def run(i):
+        _, _, send, context = plan[i]
+        if not send or not chunks[i][0].strip():
+            with lock:
+                for stage in results:
+                    stage[i] = chunks[i][0]
+            return
+
+        def on_text(parts):
+            with lock:
+                partials[i] = parts
+            if on_progress:
+                on_progress(snapshot)
+
+        current = chunks[i][0]
+        for k, instruction in enumerate(instructions):
+            last = k == stages - 1
+            current = chat_edit(client, model, instruction, current, options,
+                                stream=stream and last, on_text=on_text if last else None,
+                                cache=cache, cancel=cancel, metrics=metrics, context=context)
+            with lock:
+                results[k][i] = current
+        if on_progress:
+            on_progress(snapshot)
+
+    if n == 1:
+        run(0)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, n)) as pool:
+            futures = [pool.submit(run, i) for i in range(n)]
+            try:
+                for f in futures:
+                    f.result()
+            except Exception:
+                for f in futures:
+                    f.cancel()
+                raise
+
+    return ["".join(stage[i] + chunks[i][1] for i in range(n)).strip() for stage in results]
+
+
+def translate_many(client, model, languages, text, options=None, on_result=None,
+                   max_workers=NUM_PARALLEL, max_chars=CHUNK_CHARS, cache=None, cancel=None,
+                   metrics=None):
+    """
+    Translate text into several languages at once and return
+    {language: translation or exception}.
+
+    The source is chunked once and every (language, chunk) request goes
+    through one pool of max_workers, so the total load on Ollama stays
+    capped however many languages are asked for. Languages are scheduled in
+    order, so the first ones finish first; on_result(language, result) is
+    called from a worker thread as each language completes. A failing
+    language does not stop the others. Setting cancel raises Cancelled.
+    """
+    hard_chars = fit_chars(client, model, [translate_instruction(l) for l in languages], text, options)
+    paragraphs = split_paragraphs(text)
+    if hard_chars:
+        max_chars = min(max_chars, hard_chars)
+        paragraphs = split_long(paragraphs, hard_chars)
+    chunks = split_into_chunks(None, max_chars, paragraphs)
+    results = {language: [None] * len(chunks) for language in languages}
+    remaining = {language: len(chunks) for language in languages}
+    outcome = {}
+    lock = threading.Lock()
+
+    def run(language, i):
+        chunk = chunks[i][0]
+        with lock:
+            if language in outcome:
+                return  # an earlier chunk of this language failed
+        try:
+            if chunk.strip():
+                chunk = chat_edit(client, model, translate_instruction(language), chunk, options,
+                                  cache=cache, cancel=cancel, metrics=metrics)
+        except Cancelled:
+            raise
+        except Exception as e:
+            with lock:
+                done = language not in outcome
+                outcome.setdefault(language, e)
+            if done and on_result:
+                on_result(language, e)
+            return
+        with lock:
+            results[language][i] = chunk
+            remaining[language] -= 1
+            done = remaining[language] == 0 and language not in outcome
+            if done:
+                outcome[language] = "".join(results[language][j] + chunks[j][1] for j in range(len(chunks))).strip()
+        if done and on_result:
+            on_result(language, outcome[language])
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(run, language, i) for language in languages for i in range(len(chunks))]
+        try:
+            for f in futures:
+                f.result()
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+    return {language: outcome[language] for language in languages}
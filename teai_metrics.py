@@ -0,0 +1,264 @@
+"""
+Per-request performance metrics for TextEnhanceAI.
+
+A RequestMetrics follows one edit from the moment it is queued until its diff
+is on screen: queue wait, time to first token, generation time, Ollama's
+token counters, diff time and render time. MetricsLog appends finished
+requests as JSON lines and can keep a Prometheus text-format file (e.g. for
+the node_exporter textfile collector) with totals per model and prompt.
+"""
+import os
+import threading
+import time
+
+from teai_scratchpad import ScratchpadWriter
+
+DEFAULT_LOG_PATH = os.path.join(os.path.expanduser("~"), ".cache", "TextEnhanceAI", "metrics.jsonl")
+
+# Counters reported with the final chunk of an Ollama chat (durations in ns)
+OLLAMA_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
+
+
+def response_stats(response):
+    """Return Ollama's counters from a chat response or chunk ({} if absent)."""
+    stats = {}
+    for name in OLLAMA_FIELDS:
+        try:
+            value = response[name]
+        except Exception:
+            value = getattr(response, name, None)
+        if isinstance(value, (int, float)):
+            stats[name] = value
+    return stats
+
+
+def _seconds(start, end):
+    return None if start is None or end is None else end - start
+
+
+class RequestMetrics:
+    """
+    Timings of one request. The chat pipeline calls token(), response() and
+    cache_hit() from worker threads; the rest is set by the caller.
+    """
+    def __init__(self, model, prompt):
+        self.model = model
+        self.prompt = prompt
+        self.queued = time.perf_counter()
+        self.started = None
+        self.first_token = None
+        self.finished = None
+        self.diff_seconds = None
+        self.render_seconds = None
+        self.chat_calls = 0
+        self.cache_hits = 0
+        # Largest options sized by teai_planner, answers cut off at num_predict,
+        # and those of them that could not be retried and were kept incomplete
+        self.num_ctx = None
+        self.num_predict = None
+        self.truncations = 0
+        self.cut_offs = 0
+        self.ollama = dict.fromkeys(OLLAMA_FIELDS, 0)
+        # Caller-specific fields added to the record (e.g. the tier of a two-tier edit)
+        self.extra = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def token(self):
+        """Note that output arrived; only the first call counts."""
+        if self.first_token is None:
+            now = time.perf_counter()
+            with self._lock:
+                if self.first_token is None:
+                    self.first_token = now
+
+    def response(self, response):
+        """Add the counters of a finished chat call (its last chunk when streaming)."""
+        stats = response_stats(response)
+        if not stats:
+            return
+        with self._lock:
+            self.chat_calls += 1
+            for name, value in stats.items():
+                self.ollama[name] += value
+
+    def cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def sized(self, options):
+        """Note the num_ctx / num_predict of a chat call about to be sent."""
+        with self._lock:
+            for name in ("num_ctx", "num_predict"):
+                value = options.get(name)
+                if value is not None and (getattr(self, name) is None or value > getattr(self, name)):
+                    setattr(self, name, value)
+
+    def truncation(self):
+        with self._lock:
+            self.truncations += 1
+
+    def cut_off(self):
+        """Note an answer kept although it was cut off (see truncation)."""
+        with self._lock:
+            self.cut_offs += 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def queue_wait(self):
+        return _seconds(self.queued, self.started)
+
+    @property
+    def time_to_first_token(self):
+        return _seconds(self.started, self.first_token)
+
+    @property
+    def generation_seconds(self):
+        return _seconds(self.started, self.finished)
+
+    @property
+    def tokens_per_second(self):
+        """Decode speed reported by Ollama, averaged over the request's chat calls."""
+        if not self.ollama["eval_duration"]:
+            return None
+        return self.ollama["eval_count"] / (self.ollama["eval_duration"] / 1e9)
+
+    def as_record(self):
+        """JSON-serialisable record (seconds, rounded)."""
+        def r(value, digits=4):
+            return None if value is None else round(value, digits)
+
+        record = {
+            "event": "request",
+            "model": self.model,
+            "prompt": self.prompt,
+            "queue_wait": r(self.queue_wait),
+            "time_to_first_token": r(self.time_to_first_token),
+            "generation_seconds": r(self.generation_seconds),
+            "tokens_per_second": r(self.tokens_per_second, 1),
+            "diff_seconds": r(self.diff_seconds),
+            "render_seconds": r(self.render_seconds),
+            "chat_calls": self.chat_calls,
+            "cache_hits": self.cache_hits,
+            "num_ctx": self.num_ctx,
+            "num_predict": self.num_predict,
+            "truncations": self.truncations,
+            "cut_offs": self.cut_offs,
+        }
+        record.update(self.ollama)
+        record.update(self.extra)
+        return record
+
+    def summary(self):
+        """Compact one-line summary for the status bar."""
+        parts = []
+        if self.generation_seconds is not None:
+            parts.append(f"{self.generation_seconds:.1f} s")
+        if self.queue_wait is not None and self.queue_wait >= 0.05:
+            parts.append(f"waited {self.queue_wait:.1f} s")
+        if self.time_to_first_token is not None:
+            parts.append(f"first token {self.time_to_first_token:.2f} s")
+        if self.tokens_per_second is not None:
+            parts.append(f"{self.tokens_per_second:.0f} tok/s")
+        if self.cache_hits:
+            parts.append(f"{self.cache_hits} cached")
+        if self.truncations > self.cut_offs:
+            parts.append(f"{self.truncations - self.cut_offs} cut off and retried")
+        if self.cut_offs:
+            parts.append(f"{self.cut_offs} answer{'s' if self.cut_offs > 1 else ''} incomplete (cut off)")
+        ui_seconds = (self.diff_seconds or 0.0) + (self.render_seconds or 0.0)
+        parts.append(f"diff+render {ui_seconds * 1000:.0f} ms")
+        return ", ".join(parts)
+
+
+# --------------
+# Metrics log and Prometheus export
+# --------------
+# (metric name, type, help, function of a RequestMetrics)
+_PROM_METRICS = (
+    ("teai_requests_total", "counter", "Finished edit requests.", lambda m: 1),
+    ("teai_queue_wait_seconds_total", "counter", "Time spent queued behind other requests.",
+     lambda m: m.queue_wait or 0.0),
+    ("teai_time_to_first_token_seconds_total", "counter", "Time from start to the first output.",
+     lambda m: m.time_to_first_token or 0.0),
+    ("teai_generation_seconds_total", "counter", "Time from start to the complete answer.",
+     lambda m: m.generation_seconds or 0.0),
+    ("teai_diff_seconds_total", "counter", "Time spent computing diffs.", lambda m: m.diff_seconds or 0.0),
+    ("teai_render_seconds_total", "counter", "Time spent rendering diffs.", lambda m: m.render_seconds or 0.0),
+    ("teai_prompt_tokens_total", "counter", "Prompt tokens evaluated by Ollama.",
+     lambda m: m.ollama["prompt_eval_count"]),
+    ("teai_generated_tokens_total", "counter", "Tokens generated by Ollama.", lambda m: m.ollama["eval_count"]),
+    ("teai_eval_seconds_total", "counter", "Ollama generation time as reported by the server.",
+     lambda m: m.ollama["eval_duration"] / 1e9),
+    ("teai_cache_hits_total", "counter", "Chunks answered from the response cache.", lambda m: m.cache_hits),
+)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsLog:
+    """
+    Record finished RequestMetrics: one JSON line each in path (written off
+    the calling thread) and running totals per (model, prompt) in prom_path.
+    Either path may be None.
+    """
+    def __init__(self, path=None, prom_path=None, max_bytes=10 * 1024 * 1024):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer = ScratchpadWriter(jsonl_path=path, max_bytes=max_bytes) if path else None
+        self.prom_path = prom_path
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        if self._writer is not None:
+            self._writer.write(record=metrics.as_record())
+        if self.prom_path:
+            with self._lock:
+                totals = self._totals.setdefault((metrics.model, metrics.prompt), [0] * len(_PROM_METRICS))
+                for i, (_, _, _, value) in enumerate(_PROM_METRICS):
+                    totals[i] += value(metrics)
+                self._write_prom()
+
+    def _write_prom(self):
+        lines = []
+        for i, (name, kind, help_text, _) in enumerate(_PROM_METRICS):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (model, prompt), totals in sorted(self._totals.items()):
+                lines.append(f'{name}{{model="{_label(model)}",prompt="{_label(prompt)}"}} {totals[i]}')
+        try:
+            tmp = self.prom_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.prom_path)
+        except OSError as e:
+            print(f"Could not write metrics file: {e}")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def metrics_from_env():
+    """
+    Build the MetricsLog configured by TEAI_METRICS_LOG (JSON lines, default
+    ~/.cache/TextEnhanceAI/metrics.jsonl, empty to disable) and
+    TEAI_METRICS_PROM (Prometheus text file, off by default). Returns None
+    when both are disabled.
+    """
+    path = os.getenv("TEAI_METRICS_LOG", DEFAULT_LOG_PATH) or None
+    prom_path = os.getenv("TEAI_METRICS_PROM") or None
+    if not path and not prom_path:
+        return None
+    try:
+        return MetricsLog(path, prom_path)
+    except OSError as e:
+        print(f"Metrics log disabled: {e}")
+        return None
@@ -0,0 +1,170 @@
+"""
+Ollama client loading, model discovery and warm-up for TextEnhanceAI.
+
+The ollama package is imported on first use (ideally from a background
+thread) so it stays off the editor's startup path. The list of local models
+is cached on disk so the window can show it before Ollama answers. Models can
+be preloaded in the background so the first edit does not pay the load time.
+"""
+import json
+import os
+import threading
+import time
+
+import teai_planner
+from teai_llm import KEEP_ALIVE
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "TextEnhanceAI", "models.json")
+# Seconds before the cached model list is refreshed from Ollama
+MODELS_TTL = float(os.getenv("TEAI_MODELS_TTL", "300"))
+
+_lock = threading.Lock()
+_loaded = False
+_client = None
+_ollama_list = None
+
+
+def get_client():
+    """
+    Return the shared ollama Client, importing the package on first call.
+    Returns None if the package is not installed. Thread-safe.
+    """
+    global _loaded, _client, _ollama_list
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            try:
+                from ollama import Client
+                try:
+                    # Prefer top-level list API when available
+                    from ollama import list as ollama_list
+                except Exception:
+                    ollama_list = None
+                _client = Client()
+                _ollama_list = ollama_list
+            except ImportError:
+                print("Please install the ollama package (pip install ollama).")
+        return _client
+
+
+def use_client(client):
+    """Use client (anything with the ollama Client API) instead of importing ollama."""
+    global _loaded, _client, _ollama_list
+    with _lock:
+        _loaded = True
+        _client = client
+        _ollama_list = None
+
+
+def _model_names(resp):
+    """Extract model names from any shape of list() response."""
+    if hasattr(resp, 'models'):
+        items = getattr(resp, 'models') or []
+    elif isinstance(resp, dict) and 'models' in resp:
+        items = resp.get('models') or []
+    elif isinstance(resp, list):
+        items = resp
+    else:
+        items = []
+    names = []
+    for m in items:
+        if isinstance(m, dict):
+            name = m.get('name') or m.get('model')
+        else:
+            name = getattr(m, 'model', None) or getattr(m, 'name', None) or (str(m) if m else None)
+        if isinstance(name, str):
+            names.append(name)
+    return names
+
+
+def discover_models(client=None):
+    """Ask Ollama for the local model names. Returns [] if it cannot be reached."""
+    client = client or get_client()
+    models = []
+    # 1) Try official top-level API first
+    if _ollama_list is not None:
+        try:
+            models = _model_names(_ollama_list())
+        except Exception:
+            # ignore and fallback to client
+            pass
+    # 2) Fallback to client.list() if needed
+    if not models and client and hasattr(client, 'list'):
+        try:
+            models = _model_names(client.list())
+        except Exception:
+            pass
+    return sorted(set(models))
+
+
+def load_cached_models(path=None):
+    """Return (models, age in seconds) from the on-disk cache, or ([], None)."""
+    path = path or DEFAULT_CACHE_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return list(data["models"]), max(0.0, time.time() - float(data["time"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return [], None
+
+
+def save_cached_models(models, path=None):
+    """Remember the model list for the next start."""
+    path = path or DEFAULT_CACHE_PATH
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "models": list(models)}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def warm_up(client, model, keep_alive=KEEP_ALIVE):
+    """Load model into Ollama's memory (an empty chat does just that). Blocks."""
+    kwargs = {"keep_alive": keep_alive} if keep_alive is not None else {}
+    if teai_planner.ENABLED:
+        # Load with the context size short edits will ask for, so they do not reload it
+        kwargs["options"] = {"num_ctx": teai_planner.MIN_CTX}
+    client.chat(model=model, messages=[], **kwargs)
+
+
+class ModelWarmer:
+    """
+    Preload models from background threads, at most one load per model at a
+    time. on_state(model, state, detail) is called from the loading thread with
+    state "loading", then "loaded" (detail: seconds) or "failed" (detail: error).
+    """
+    def __init__(self, client_getter=get_client, on_state=None, keep_alive=KEEP_ALIVE):
+        self._client_getter = client_getter
+        self._on_state = on_state or (lambda model, state, detail: None)
+        self._keep_alive = keep_alive
+        self._loading = set()
+        self._lock = threading.Lock()
+
+    def warm(self, model):
+        """Start loading model unless it is already being loaded. Never blocks."""
+        with self._lock:
+            if not model or model in self._loading:
+                return False
+            self._loading.add(model)
+        threading.Thread(target=self._load, args=(model,), name="teai-warmup", daemon=True).start()
+        return True
+
+    def _load(self, model):
+        try:
+            client = self._client_getter()
+            if client is None:
+                return
+            self._on_state(model, "loading", None)
+            start = time.perf_counter()
+            try:
+                warm_up(client, model, self._keep_alive)
+            except Exception as e:
+                self._on_state(model, "failed", e)
+            else:
+                self._on_state(model, "loaded", time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._loading.discard(model)
@@ -0,0 +1,76 @@
+"""
+Named multi-stage pipelines for TextEnhanceAI.
+
+A pipeline is a list of PROMPTS names run in order, e.g. Grammar > Concise >
+Polish (see teai_llm.edit_pipeline). Presets are kept in a small JSON file,
+TEAI_PIPELINES_PATH (default ~/.config/TextEnhanceAI/pipelines.json).
+"""
+import json
+import os
+
+from teai_llm import PROMPTS
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".config", "TextEnhanceAI", "pipelines.json")
+
+# Presets available before the user saves any
+DEFAULT_PIPELINES = {
+    "Clean up": ["Grammar", "Concise", "Polish"],
+    "Full pass": ["Proofread", "Streamline", "Natural"],
+}
+
+
+def pipelines_path():
+    return os.getenv("TEAI_PIPELINES_PATH", DEFAULT_PATH)
+
+
+def parse_stages(spec):
+    """
+    Turn "Grammar > Concise > Polish" (or comma-separated) into a list of
+    PROMPTS names. Raises ValueError for unknown or missing names.
+    """
+    names = [part.strip() for part in spec.replace(",", ">").split(">") if part.strip()]
+    if not names:
+        raise ValueError("A pipeline needs at least one stage.")
+    by_lower = {name.lower(): name for name in PROMPTS}
+    stages = []
+    for name in names:
+        if name.lower() not in by_lower:
+            raise ValueError(f"Unknown prompt {name!r}; choose from {', '.join(PROMPTS)}.")
+        stages.append(by_lower[name.lower()])
+    return stages
+
+
+def format_stages(stages):
+    return " > ".join(stages)
+
+
+def load_pipelines(path=None):
+    """Return {name: [stage, ...]} with the saved presets after the defaults."""
+    pipelines = dict(DEFAULT_PIPELINES)
+    try:
+        with open(path or pipelines_path(), encoding="utf-8") as f:
+            saved = json.load(f)
+        for name, stages in saved.items():
+            if isinstance(stages, list) and stages and all(s in PROMPTS for s in stages):
+                pipelines[name] = list(stages)
+    except (OSError, ValueError, AttributeError):
+        pass
+    return pipelines
+
+
+def save_pipeline(name, stages, path=None):
+    """Add or replace the preset name in the presets file."""
+    path = path or pipelines_path()
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if not isinstance(saved, dict):
+            saved = {}
+    except (OSError, ValueError):
+        saved = {}
+    saved[name] = list(stages)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(saved, f, indent=1)
+    os.replace(tmp, path)
@@ -0,0 +1,120 @@
+"""
+Context-window planning for TextEnhanceAI requests.
+
+Token counts of the system prompt, instruction, context and text are
+estimated from their characters, and every chat request gets num_predict and
+num_ctx sized to it: room for TEAI_OUTPUT_RATIO times the text's tokens of
+output, and a context holding prompt plus output. num_ctx is rounded up to a
+power of two so that Ollama, which reloads a model when num_ctx changes, sees
+only a few distinct sizes. It is capped by the model's own context length
+(from client.show) and by TEAI_MAX_CTX; texts that would not fit are split
+further (see teai_llm.plan_chunks). TEAI_PLAN=0 restores the fixed options.
+"""
+import math
+import os
+import re
+import threading
+
+ENABLED = os.getenv("TEAI_PLAN", "1") != "0"
+# Largest num_ctx ever requested; bounds the memory Ollama allocates per request
+MAX_CTX = int(os.getenv("TEAI_MAX_CTX", "16384"))
+MIN_CTX = 2048
+# Expected output tokens per input token (an edit is about as long as its text)
+OUTPUT_RATIO = float(os.getenv("TEAI_OUTPUT_RATIO", "1.5"))
+MIN_PREDICT = 256
+# Chat template and role markers wrapped around the messages
+TEMPLATE_TOKENS = 32
+
+# Characters per token for alphabetic scripts, on the low side of what BPE
+# vocabularies achieve so estimates err towards more tokens
+CHARS_PER_TOKEN = 3.5
+# CJK ideographs, kana and hangul take about one token each
+_WIDE = re.compile(r"[\u1100-\u11ff\u2e80-\ua4cf\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+_context_lengths = {}
+_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token count of text, erring on the high side."""
+    if not text:
+        return 0
+    wide = len(_WIDE.findall(text))
+    return wide + math.ceil((len(text) - wide) / CHARS_PER_TOKEN)
+
+
+def context_length(client, model):
+    """The model's trained context length from client.show(), or None; cached per model."""
+    with _lock:
+        if model in _context_lengths:
+            return _context_lengths[model]
+    try:
+        info = client.show(model)
+    except Exception:
+        # Unreachable server or a client without show(); ask again next time
+        return None
+    try:
+        modelinfo = info["modelinfo"]
+    except Exception:
+        modelinfo = getattr(info, "modelinfo", None)
+    length = None
+    for key, value in (modelinfo or {}).items():
+        if key.endswith(".context_length"):
+            length = int(value)
+            break
+    with _lock:
+        _context_lengths[model] = length
+    return length
+
+
+def max_context(client, model):
+    """Largest num_ctx to request from model."""
+    length = context_length(client, model)
+    return min(MAX_CTX, length) if length else MAX_CTX
+
+
+def context_size(tokens, limit):
+    """Smallest power of two (from MIN_CTX) holding tokens, at most limit."""
+    size = MIN_CTX
+    while size < tokens:
+        size *= 2
+    return min(size, limit)
+
+
+def plan_options(client, model, messages, text):
+    """
+    Return {"num_predict", "num_ctx"} for a chat with messages whose text to
+    edit is text.
+    """
+    prompt = TEMPLATE_TOKENS + sum(estimate_tokens(m["content"]) for m in messages)
+    limit = max_context(client, model)
+    num_predict = max(MIN_PREDICT, math.ceil(estimate_tokens(text) * OUTPUT_RATIO))
+    # A text too large for the window still gets whatever room is left
+    num_predict = max(MIN_PREDICT, min(num_predict, limit - prompt))
+    return {"num_predict": num_predict, "num_ctx": context_size(prompt + num_predict, limit)}
+
+
+def grow_options(client, model, messages, options):
+    """
+    Options allowing twice the output after a response was cut off by
+    num_predict, or None when the context window has no more room.
+    """
+    prompt = TEMPLATE_TOKENS + sum(estimate_tokens(m["content"]) for m in messages)
+    limit = max_context(client, model)
+    current = options.get("num_predict") or MIN_PREDICT
+    num_predict = min(current * 2, limit - prompt)
+    if num_predict <= current:
+        return None
+    return dict(options, num_predict=num_predict, num_ctx=context_size(prompt + num_predict, limit))
+
+
+def max_text_chars(client, model, overhead, text):
+    """
+    Longest piece of text (in characters) that fits model's window together
+    with overhead prompt tokens and its expected output, using text's own
+    characters-per-token ratio.
+    """
+    tokens = (max_context(client, model) - TEMPLATE_TOKENS - overhead) / (1 + OUTPUT_RATIO)
+    sample = text[:100000]
+    chars_per_token = len(sample) / estimate_tokens(sample) if sample else CHARS_PER_TOKEN
+    return max(200, int(tokens * chars_per_token))
@@ -0,0 +1,158 @@
+"""
+Background writer for the TextEnhanceAI scratchpad.
+
+Log entries are queued by the UI thread and written by a single worker
+thread in batches. Files are flushed after every batch and fsynced on a
+timer and on close. A file growing past max_bytes is compressed to
+"<name>.<n><ext>.gz" and started afresh. Besides the Markdown scratchpad,
+entries can be written as JSON lines for later processing, and records can
+be stored in the searchable edit archive (teai_archive).
+"""
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+FORMATS = ("md", "jsonl", "both")
+
+_STOP = object()
+
+
+class ScratchpadWriter:
+    """
+    Append Markdown text and/or JSON records to scratchpad files off the UI thread.
+
+    md_path / jsonl_path may be None to skip that format. With archive (a
+    teai_archive.EditArchive), records are also stored there under session.
+    """
+    def __init__(self, md_path=None, jsonl_path=None, max_bytes=10 * 1024 * 1024, flush_interval=2.0,
+                 archive=None, session=None):
+        self.md_path = md_path
+        self.jsonl_path = jsonl_path
+        self.archive = archive
+        self.session = session
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._files = {}
+        self._thread = threading.Thread(target=self._run, name="scratchpad-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, markdown=None, record=None):
+        """Queue a Markdown snippet and/or a JSON-serialisable record. Never blocks."""
+        if record is not None and "time" not in record:
+            record = dict(record, time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self._queue.put((markdown, record))
+
+    def close(self, timeout=5.0):
+        """Write everything still queued, fsync and close the files."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # --------------
+    # Worker thread
+    # --------------
+    def _run(self):
+        last_sync = time.monotonic()
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            # Take whatever else is already waiting so it is written in one go
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            entries = [item for item in batch if item is not _STOP]
+
+            try:
+                if entries:
+                    self._write_batch(entries)
+                if stop or time.monotonic() - last_sync >= self.flush_interval:
+                    self._sync()
+                    last_sync = time.monotonic()
+            except Exception as e:
+                # Keep the thread alive; later entries are still written
+                print(f"Scratchpad write failed: {e}")
+
+            if stop:
+                for f in self._files.values():
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                self._files.clear()
+                return
+
+    def _write_batch(self, entries):
+        if self.md_path:
+            text = "".join(md for md, _ in entries if md)
+            if text:
+                self._append(self.md_path, text)
+        if self.jsonl_path:
+            lines = []
+            for _, rec in entries:
+                if rec is None:
+                    continue
+                try:
+                    lines.append(json.dumps(rec, ensure_ascii=False) + "\n")
+                except (TypeError, ValueError) as e:
+                    print(f"Scratchpad record skipped: {e}")
+            if lines:
+                self._append(self.jsonl_path, "".join(lines))
+        if self.archive is not None:
+            records = [rec for _, rec in entries if rec is not None]
+            if records:
+                self.archive.add_records(records, session=self.session)
+
+    def _append(self, path, text):
+        f = self._files.get(path)
+        if f is None:
+            f = self._files[path] = open(path, "a", encoding="utf-8")
+        f.write(text)
+        f.flush()
+        if self.max_bytes and f.tell() > self.max_bytes:
+            self._rotate(path)
+
+    def _sync(self):
+        for f in self._files.values():
+            os.fsync(f.fileno())
+
+    def _rotate(self, path):
+        """Compress the full file next to it and start a new one."""
+        f = self._files.pop(path)
+        os.fsync(f.fileno())
+        f.close()
+        stem, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists(f"{stem}.{n}{ext}.gz"):
+            n += 1
+        with open(path, "rb") as src, gzip.open(f"{stem}.{n}{ext}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+
+def writer_for_session(stem, archive=None):
+    """
+    Create the writer for a scratchpad session named stem (without extension),
+    configured by TEAI_SCRATCHPAD_FORMAT (md, jsonl or both) and
+    TEAI_SCRATCHPAD_MAX_MB. Records also go to archive, if given.
+    """
+    fmt = os.getenv("TEAI_SCRATCHPAD_FORMAT", "md").lower()
+    if fmt not in FORMATS:
+        fmt = "md"
+    max_bytes = int(float(os.getenv("TEAI_SCRATCHPAD_MAX_MB", "10")) * 1024 * 1024)
+    return ScratchpadWriter(
+        md_path=f"{stem}.md" if fmt in ("md", "both") else None,
+        jsonl_path=f"{stem}.jsonl" if fmt in ("jsonl", "both") else None,
+        max_bytes=max_bytes,
+        archive=archive,
+        session=os.path.basename(stem),
+    )
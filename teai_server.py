@@ -0,0 +1,325 @@
+"""
+Local HTTP service mode for TextEnhanceAI.
+
+Exposes the editor's actions over a small JSON API so editors and scripts can
+share one Ollama instance:
+
+    GET  /health    queue and cache counters
+    GET  /prompts   the built-in actions
+    POST /edit      {"text": ..., "prompt": "Grammar" | "instruction": ... |
+                     "translate": "German", "model": ..., "stream": false}
+
+/edit answers with the edited text and the structured diff. With
+"stream": true the answer is newline-delimited JSON: {"partial": ...} lines
+while the model writes, then the final object. Identical requests already
+in flight are coalesced; when the queue is full the server answers 429.
+
+Example:
+    python teai_server.py --port 8765 --queue 32 --per-model 2
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import teai_diff
+import teai_llm
+import teai_models
+from teai_cache import cache_from_env, cache_key
+
+# Minimum delay between two {"partial": ...} lines of a streamed answer
+STREAM_INTERVAL = 0.1
+
+
+class QueueFull(Exception):
+    """Raised when the service already holds its maximum number of requests."""
+
+
+class ModelGate:
+    """
+    Client wrapper capping concurrent chat calls per model. A streamed call
+    holds its slot until the stream has been consumed.
+    """
+    def __init__(self, client, per_model):
+        self._client = client
+        self._per_model = per_model
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, model):
+        with self._lock:
+            if model not in self._slots:
+                self._slots[model] = threading.BoundedSemaphore(self._per_model)
+            return self._slots[model]
+
+    def chat(self, model, **kwargs):
+        slot = self._slot(model)
+        slot.acquire()
+        try:
+            response = self._client.chat(model=model, **kwargs)
+        except Exception:
+            slot.release()
+            raise
+        if not kwargs.get("stream"):
+            slot.release()
+            return response
+        return self._hold(slot, response)
+
+    def _hold(self, slot, stream):
+        try:
+            yield from stream
+        finally:
+            slot.release()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class EditService:
+    """
+    Admission control and request coalescing in front of the document pipeline.
+
+    At most max_queue distinct requests are admitted (waiting or running);
+    identical requests arriving meanwhile share the first one's result.
+    """
+    def __init__(self, client, default_model, max_queue=32, per_model=teai_llm.NUM_PARALLEL, cache=None):
+        self.client = ModelGate(client, per_model)
+        self.default_model = default_model
+        self.max_queue = max_queue
+        self.cache = cache
+        self.admitted = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def edit(self, instruction, text, model=None, on_progress=None):
+        """
+        Return (edited_text, coalesced). Raises QueueFull when saturated.
+        on_progress(snapshot) is only called for the request doing the work.
+        """
+        model = model or self.default_model
+        key = cache_key(model, teai_llm.SYSTEM_PROMPT, instruction, teai_llm.DEFAULT_OPTIONS, text)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                if self.admitted >= self.max_queue:
+                    self.rejected += 1
+                    raise QueueFull()
+                self.admitted += 1
+                future = self._inflight[key] = Future()
+                leader = True
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = teai_llm.edit_document(
+                self.client, model, instruction, text,
+                stream=on_progress is not None, on_progress=on_progress, cache=self.cache,
+            )
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                self.admitted -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "admitted": self.admitted,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None  # EditService, set by make_server()
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write(f"{self.address_string()} - {fmt % args}\n")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.stats())
+        elif self.path == "/prompts":
+            self._send_json(200, teai_llm.PROMPTS)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/edit":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            text = request["text"].strip()
+            if request.get("prompt"):
+                instruction = teai_llm.PROMPTS[request["prompt"]]
+            elif request.get("translate"):
+                instruction = teai_llm.translate_instruction(request["translate"])
+            else:
+                instruction = request["instruction"]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        if not text:
+            self._send_json(400, {"error": "text is empty"})
+            return
+        model = request.get("model") or self.service.default_model
+        if request.get("stream"):
+            self._edit_streaming(text, instruction, model)
+        else:
+            self._edit(text, instruction, model)
+
+    def _result(self, text, instruction, model, edited, coalesced, seconds):
+        return {
+            "edited_text": edited,
+            "instruction": instruction,
+            "model": model,
+            "coalesced": coalesced,
+            "seconds": round(seconds, 3),
+            "diff": teai_diff.TextDiff(text, edited).as_dict(),
+        }
+
+    def _edit(self, text, instruction, model):
+        start = time.perf_counter()
+        try:
+            edited, coalesced = self.service.edit(instruction, text, model)
+        except QueueFull:
+            self._send_json(429, {"error": "queue full, retry later"}, {"Retry-After": "1"})
+            return
+        except Exception as e:
+            self._send_json(502, {"error": str(e)})
+            return
+        self._send_json(200, self._result(text, instruction, model, edited, coalesced,
+                                          time.perf_counter() - start))
+
+    def _edit_streaming(self, text, instruction, model):
+        start = time.perf_counter()
+        lock = threading.Lock()
+        state = {"headers": False, "last": 0.0, "gone": False}
+
+        def send_line(payload):
+            # Headers go out with the first line, so a 429 can still be sent before
+            if not state["headers"]:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+                self.end_headers()
+                state["headers"] = True
+            self.wfile.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+        def on_progress(snapshot):
+            now = time.monotonic()
+            with lock:
+                if state["gone"] or now - state["last"] < STREAM_INTERVAL:
+                    return
+                state["last"] = now
+                try:
+                    send_line({"partial": snapshot()})
+                except OSError:
+                    # This client disconnected; the work goes on for requests sharing it
+                    state["gone"] = True
+
+        try:
+            edited, coalesced = self.service.edit(instruction, text, model, on_progress=on_progress)
+        except QueueFull:
+            self._send_json(429, {"error": "queue full, retry later"}, {"Retry-After": "1"})
+            return
+        except Exception as e:
+            with lock:
+                if state["gone"]:
+                    return
+                if state["headers"]:
+                    send_line({"error": str(e)})
+                else:
+                    self._send_json(502, {"error": str(e)})
+            return
+        with lock:
+            if state["gone"]:
+                return
+            send_line(dict(self._result(text, instruction, model, edited, coalesced,
+                                        time.perf_counter() - start), done=True))
+
+
+def make_server(service, host="127.0.0.1", port=8765):
+    """Build (but do not start) the HTTP server for service."""
+    handler = type("TEAIHandler", (Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def _print_model_state(model, state, detail):
+    if state == "loaded":
+        print(f"Model {model} loaded in {detail:.1f} s", file=sys.stderr)
+    elif state == "failed":
+        print(f"Model {model} could not be loaded: {detail}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve TextEnhanceAI actions over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765).")
+    parser.add_argument("--model", default=os.getenv("TEAI_MODEL", "llama3.1:8b"),
+                        help="Default model (default: TEAI_MODEL or llama3.1:8b).")
+    parser.add_argument("--ollama", default=None, help="Ollama host, e.g. http://localhost:11434.")
+    parser.add_argument("--queue", type=int, default=32,
+                        help="Maximum requests waiting or running before answering 429 (default: 32).")
+    parser.add_argument("--per-model", type=int, default=teai_llm.NUM_PARALLEL,
+                        help="Concurrent Ollama calls per model (default: TEAI_NUM_PARALLEL).")
+    args = parser.parse_args(argv)
+
+    try:
+        from ollama import Client
+    except ImportError:
+        print("Please install the ollama package (pip install ollama).", file=sys.stderr)
+        return 1
+    client = Client(host=args.ollama) if args.ollama else Client()
+    service = EditService(client, args.model, max_queue=max(1, args.queue),
+                          per_model=max(1, args.per_model), cache=cache_from_env())
+    server = make_server(service, args.host, args.port)
+    # Load the default model now rather than inside the first request
+    teai_models.ModelWarmer(lambda: client, on_state=_print_model_state).warm(args.model)
+    print(f"TextEnhanceAI server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())